@@ -13,11 +13,28 @@ from time import time
 import csv
 import pickle
 import shared as s
+import shards
 
 ###############################################################################
 ### Simulation-related graph plotting functions
 ###############################################################################
 
+## Data gathered on host 0 by finalizeSim, or read lazily from the file of each host if they were saved in shards (see shards.py)
+def getspikes():
+    if s.saveshards: return shards.ShardedData(shards.filestem()).spikes()
+    return s.allspiketimes, s.allspikecells
+
+def getlfps():
+    if s.saveshards: return shards.ShardedData(shards.filestem())['lfps']
+    return s.lfps
+
+def getweightchanges():
+    if s.saveshards:
+        data = shards.ShardedData(shards.filestem())
+        return data['weightchanges'], data['stdpconndata']
+    return s.allweightchanges, s.allstdpconndata
+
+
 ## Create colormap
 def bicolormap(gap=0.1,mingreen=0.2,redbluemix=0.5,epsilon=0.01):
    from matplotlib.colors import LinearSegmentedColormap as makecolormap
@@ -52,9 +69,10 @@ def bicolormap(gap=0.1,mingreen=0.2,redbluemix=0.5,epsilon=0.01):
 def plotraster(filename=None): # allspiketimes, allspikecells, EorI, ncells, connspercell, backgroundweight, firingrate, duration): # Define a function for plotting a raster
     plotstart = time() # See how long it takes to plot
     EorIcolors = array([(1,0.4,0) , (0,0.2,0.8)]) # Define excitatory and inhibitory colors -- orange and turquoise
-    cellcolors = EorIcolors[array(s.EorI)[array(s.allspikecells,dtype=int)]] # Set each cell to be either orange or turquoise
+    allspiketimes, allspikecells = getspikes()
+    cellcolors = EorIcolors[array(s.EorI)[array(allspikecells,dtype=int)]] # Set each cell to be either orange or turquoise
     figure() # Open a new figure
-    scatter(s.allspiketimes,s.allspikecells,10,cellcolors,linewidths=0.5,marker='|') # Create raster  
+    scatter(allspiketimes,allspikecells,10,cellcolors,linewidths=0.5,marker='|') # Create raster  
     xlabel('Time (ms)')
     ylabel('Cell ID')
     title('cells=%i syns/cell=%0.1f noise=%0.1f rate=%0.1f Hz' % (s.ncells,s.connspercell,s.backgroundweight[0],s.firingrate),fontsize=12)
@@ -69,9 +87,10 @@ def plotraster(filename=None): # allspiketimes, allspikecells, EorI, ncells, con
 def plotPETH():
     binsize = 20 # bin size in ms
     binedges = arange(0, s.duration+binsize, binsize)
+    allspiketimes, allspikecells = getspikes()
     peth = []
     for ipop in unique(s.cellpops):
-        hist,binedges = histogram(s.allspiketimes[array([s.cellpops[int(i)] for i in s.allspikecells]) == ipop], binedges)
+        hist,binedges = histogram(allspiketimes[array([s.cellpops[int(i)] for i in allspikecells]) == ipop], binedges)
         peth.append(hist)
     figure()
     plot(array(peth).T)
@@ -89,9 +108,10 @@ def plotpsd():
     colorspsd=array([[0.42,0.67,0.84],[0.42,0.83,0.59],[0.90,0.76,0.00],[0.90,0.32,0.00],[0.34,0.67,0.67],[0.42,0.82,0.83],[0.90,0.59,0.00],[0.33,0.67,0.47],[1.00,0.85,0.00],[0.71,0.82,0.41],[0.57,0.67,0.33],[1.00,0.38,0.60],[0.5,0.2,0.0],[0.0,0.2,0.5]]) 
 
     lfpv=[[] for c in range(len(s.lfppops))]    
+    lfps = getlfps()
     # Get last modified .mat file if no input and plot
     for c in range(len(s.lfppops)):
-        lfpv[c] = s.lfps[:,c]    
+        lfpv[c] = lfps[:,c]    
     lfptot = sum(lfpv)
         
     # plot pops separately
@@ -169,9 +189,10 @@ def plotweightchanges(filename=None):
     	h = axes()
 
     	# create data matrix
-        wcs = [x[-1][-1] for x in s.allweightchanges] # absolute final weight
-    	wcs = [x[-1][-1]-x[0][-1] for x in s.allweightchanges] # absolute weight change
-    	pre,post,recep = zip(*[(x[0],x[1],x[2]) for x in s.allstdpconndata])
+        allweightchanges, allstdpconndata = getweightchanges()
+        wcs = allweightchanges[-1] # absolute final weight
+    	wcs = allweightchanges[-1]-allweightchanges[0] # absolute weight change
+    	pre,post,recep = zip(*[(x[0],x[1],x[2]) for x in allstdpconndata])
     	ncells = int(max(max(pre),max(post))+1)
     	wcmat = zeros([ncells, ncells])
 
@@ -201,19 +222,12 @@ def plotweightchanges(filename=None):
             figure()
             relative = 1 # relative or absolute w changes
 
-            wc = array([wi[-1] for w in s.allweightchanges for wi in w if len(w)>1])
-
-            maxSteps = max([len(w) for w in s.allweightchanges])
-            wc = zeros((len(s.allweightchanges), maxSteps))
-            for iconn,conn in enumerate(s.allweightchanges):
-                for it in range(maxSteps):
-                    if relative:
-                        wc[iconn, it] = conn[it][-1]-conn[0][-1] if len(conn)>it else wc[iconn, it-1]
-                    else:
-                        wc[iconn, it] = conn[it][-1] if len(conn)>it else wc[iconn, it-1]
+            maxSteps = len(allweightchanges) # Number of weight snapshots
+            if relative: wc = (allweightchanges - allweightchanges[0]).T # connection x time
+            else: wc = allweightchanges.T
 
-            vmax = max([max(row) for row in wc])
-            vmin = min([min(row) for row in wc])
+            vmax = wc.max()
+            vmin = wc.min()
             pcolor(wc, cmap='hot_r', vmin=vmin, vmax=vmax)
             xlim((0,maxSteps))
             ylim((0,len(wc)))
@@ -237,17 +251,18 @@ def plotmotorpopchanges():
             Iwpost = []
             IwpreSum = []
             IwpostSum = [] 
+        allweightchanges, allstdpconndata = getweightchanges()
         for imus in range(len(s.motorCmdCellRange)):
-            Ewpre.append([x[0][-1] for (icon,x) in enumerate(s.allweightchanges) if s.allstdpconndata[icon][1] in s.motorCmdCellRange[imus]])
-            Ewpost.append([x[-1][-1] for (icon,x) in enumerate(s.allweightchanges) if s.allstdpconndata[icon][1] in s.motorCmdCellRange[imus]])
+            Ewpre.append([allweightchanges[0][icon] for icon in range(len(allstdpconndata)) if allstdpconndata[icon][1] in s.motorCmdCellRange[imus]])
+            Ewpost.append([allweightchanges[-1][icon] for icon in range(len(allstdpconndata)) if allstdpconndata[icon][1] in s.motorCmdCellRange[imus]])
             EwpreSum.append(sum(Ewpre[imus]))
             EwpostSum.append(sum(Ewpost[imus]))
        
 
             if showInh:
                 motorInhCellRange = s.motorCmdCellRange[imus] - s.popGidStart[s.EDSC] + s.popGidStart[s.IDSC]
-                Iwpre.append([x[0][-1] for (icon,x) in enumerate(s.allweightchanges) if s.allstdpconndata[icon][1] in motorInhCellRange])
-                Iwpost.append([x[-1][-1] for (icon,x) in enumerate(s.allweightchanges) if s.allstdpconndata[icon][1] in motorInhCellRange])
+                Iwpre.append([allweightchanges[0][icon] for icon in range(len(allstdpconndata)) if allstdpconndata[icon][1] in motorInhCellRange])
+                Iwpost.append([allweightchanges[-1][icon] for icon in range(len(allstdpconndata)) if allstdpconndata[icon][1] in motorInhCellRange])
                 IwpreSum.append(sum(Iwpre[imus]))
                 IwpostSum.append(sum(Iwpost[imus]))
 
@@ -15,7 +15,8 @@ Version: 2015jan28 by salvadordura@gmail.com
 
 from neuron import h
 import arminterface
-from numpy import array, zeros, pi, ones, cos, sin, mean
+from numpy import array, zeros, pi, ones, cos, sin, mean, searchsorted
+from time import time
 from pylab import concatenate, figure, show, ion, ioff, pause,xlabel, ylabel, plot, Circle, sqrt, arctan, arctan2, close
 from copy import copy
 from random import uniform, seed, sample, randint
@@ -114,6 +115,7 @@ class Arm:
             self.error = 0 # error signal (eg. difference between )
             self.critic = 0 # critic signal (1=reward; -1=punishment)
             self.initArmMovement = self.initArmMovement + s.testTime
+            self.armState = list(self.ang) + list(self.angVel) + self.angles2pos(self.ang, self.armLen) # send reset state at the next exchange
         
 
     def setPMdInput(self, s):
@@ -148,8 +150,28 @@ class Arm:
                 self.critic = 0
         else: # if 
             self.critic = 0
+        self.nextCritic = self.critic # sent to all workers at the next exchange
         return self.critic
 
+    #%% count spikes of muscle i in the time window (t-cmdtimewin, t) -- starts from the first spike still in the window, so cost doesn't grow with time
+    def countCmdSpikes(self, i, t):
+        countStart = time()
+        count = 0
+        for c,vec in enumerate(self.cmdSpikeVecs[i]):
+            spikes = vec.as_numpy() # no copy
+            start = self.cmdStart[i][c]
+            if start > len(spikes): start = 0 # vector was cleared by a new initialization
+            start += searchsorted(spikes[start:], t-self.cmdtimewin, 'right') # skip spikes that have left the window
+            count += searchsorted(spikes[start:], t, 'left') # spikes before t
+            self.cmdStart[i][c] = start
+        self.cmdTimeAll.append(time()-countStart)
+        return count
+
+    #%% spikes were removed from the start of the spike vectors (nspikes per local cell, see spikestream.py) -- shift the window starts accordingly
+    def cmdSpikesRemoved(self, nspikes):
+        for i in range(len(self.cmdCellIds)):
+            self.cmdStart[i] = [max(start - nspikes[id], 0) for start,id in zip(self.cmdStart[i], self.cmdCellIds[i])]
+
     #%% plot joint angles
     def plotTraj(self, filename):
         fig = figure() 
@@ -216,7 +238,9 @@ class Arm:
     ################################
     def setup(self, s):#, nduration, loopstep, RLinterval, pc, scale, popnumbers, p): 
         self.duration = s.duration#/1000.0 # duration in msec
-        self.interval = s.loopstep#/1000.0 # interval between arm updates in ,sec       
+        if s.armExchangeInterval < s.loopstep or abs(s.armExchangeInterval/float(s.loopstep) - round(s.armExchangeInterval/float(s.loopstep))) > 1e-9: # runSim only checks for an exchange once per loopstep
+            raise Exception('armExchangeInterval (%g ms) must be a positive multiple of loopstep (%g ms)' % (s.armExchangeInterval, s.loopstep))
+        self.interval = s.armExchangeInterval # interval between arm updates in msec
         self.RLinterval = s.RLinterval # interval between RL updates in msec
         self.minRLerror = s.minRLerror # minimum error change for RL (m)
         self.armLen = s.armLen # elbow - shoulder from MSM;radioulnar - elbow from MSM;  
@@ -247,6 +271,13 @@ class Arm:
         self.vec = h.Vector()
         self.cmdmaxrate = s.cmdmaxrate # maximum spikes for motor command (normalizing value)
         self.cmdtimewin = s.cmdtimewin # spike time window for shoulder motor command (ms)
+        self.cmdCellIds = [[s.gidDic[gid] for gid in s.motorCmdCellRange[i] if gid in s.gidDic] for i in range(s.nMuscles)] # local index of each muscle's motor command cells on this node
+        self.cmdSpikeVecs = [[s.hostspikevecs[id] for id in ids] for ids in self.cmdCellIds] # spike vectors of each muscle's motor command cells on this node
+        self.cmdStart = [[0]*len(ids) for ids in self.cmdCellIds] # index of the first spike of each cell still inside the time window
+        self.cmdTimeAll = [] # time (s) taken to count motor command spikes at each step
+        self.armState = list(self.ang) + list(self.angVel) + self.angles2pos(self.ang, self.armLen) # arm state sent by worker 0 at the next exchange (angles, angular velocities, hand position)
+        self.nextCritic = 0 # critic signal sent by worker 0 at the next exchange
+        self.exchangeTimeAll = [] # time (s) taken by the collective at each exchange
 
 
         # proprioceptive encoding
@@ -349,58 +380,32 @@ class Arm:
 
             ## Only move after initial period - avoids initial transitory spiking period (NSLOC sync spikes), and allows for variables with history to clear
             # can be justified as preparatory period (eg. watiing for go cue)
-            if t > self.initArmMovement:
-                ## Gather spikes #### from all vectors to then calculate motor command 
-                for i in range(s.nMuscles):
-                    cmdVecs = [array(s.hostspikevecs[x]) for x in range(s.cellsperhost) if (s.gidVec[x] in s.motorCmdCellRange[i])]
-                    self.motorCmd[i] = sum([len(x[(x < t) * (x > t-self.cmdtimewin)]) for x in cmdVecs])
-                    s.pc.allreduce(self.vec.from_python([self.motorCmd[i]]), 1) # sum
-                    self.motorCmd[i] = self.vec.to_python()[0]       
-            # else:
-            #     for i in range(s.nMuscles): # stimulate all muscles equivalently so arm doesnt move
-            #         self.motorCmd[i] = 0.2 * self.cmdmaxrate
-
-                ## Calculate final motor command 
-                if s.rank==0:  
-                    self.motorCmd = [x / self.cmdmaxrate for x in self.motorCmd]  # normalize motor command 
-                    if s.antagInh: # antagonist inhibition
-                        if self.motorCmd[SH_EXT] > self.motorCmd[SH_FLEX]: # sh ext > sh flex
-                            self.motorCmd[SH_FLEX] =  self.motorCmd[SH_FLEX]**2 / self.motorCmd[SH_EXT] / s.antagInh
-                        elif self.motorCmd[SH_EXT] < self.motorCmd[SH_FLEX]: # sh flex > sh ext
-                            self.motorCmd[SH_EXT] = self.motorCmd[SH_EXT]**2 / self.motorCmd[SH_FLEX] / s.antagInh
-                        if self.motorCmd[EL_EXT] > self.motorCmd[EL_FLEX]: # el ext > el flex
-                            self.motorCmd[EL_FLEX] = self.motorCmd[EL_FLEX]**2 / self.motorCmd[EL_EXT] / s.antagInh
-                        elif self.motorCmd[EL_EXT] < self.motorCmd[EL_FLEX]: # el ext > el flex
-                            self.motorCmd[EL_EXT] = self.motorCmd[EL_EXT]**2 / self.motorCmd[EL_FLEX] / s.antagInh
-             
+            moving = t > self.initArmMovement
+        else:
+            moving = False
+        # else:
+        #     for i in range(s.nMuscles): # stimulate all muscles equivalently so arm doesnt move
+        #         self.motorCmd[i] = 0.2 * self.cmdmaxrate
+
 
         ############################
-        # ALL arms: Send motor command to virtual arm; receive new position; update proprioceptive population (ASC)
+        # ALL arms: exchange motor command and arm state in a single collective; update proprioceptive population (ASC)
         ############################
-        # Worker 0 sends motor commands and receives data from virtual arm
-        #print "t=%f , self.initArmMovement=%f"%(t, self.initArmMovement)
-        if s.rank == 0:
-            if self.type == 'musculoskeletal': # MUSCULOSKELETAL
-                try:
-                    dataReceived = arminterface.sendAndReceiveDataPackets(t, self.interval, self.motorCmd[0], self.motorCmd[1], self.motorCmd[2], self.motorCmd[3])
-                except:
-                    dataReceived = [self.ang[SH], self.ang[EL]]
-                if not dataReceived or dataReceived==[-3,3]:  # if error receiving packet
-                    dataReceived = [self.ang[SH], self.ang[EL]]  # use previous packet
-                    print 'Missed packet at t=%.2f',t
-            elif self.type == 'dummyArm': # DUMMYARM
-                dataReceived = self.runDummyArm(self.motorCmd) # run dummyArm
-            elif self.type == 'randomOutput': # RANDOMOUTPUT
-                dataReceived = [0,0] 
-                dataReceived[0] = uniform(self.minPval, self.maxPval) # generate 2 random values  
-                dataReceived[1] = uniform(self.minPval, self.maxPval)  
-            # broadcast dataReceived  to other workers.   
-            n = s.pc.broadcast(self.vec.from_python(dataReceived), 0) # convert python list to hoc vector for broadcast data received from arm
-        else: # other workers
-            n = s.pc.broadcast(self.vec, 0)  # receive shoulder and elbow angles from worker0 so can compare with cells in this worker
-            dataReceived = self.vec.to_python()  
+        # Spike counts of each muscle's motor command cells in the last cmdtimewin ms are summed over workers, and worker 0
+        # adds the arm state and critic from its last arm step (other workers add zeros) -- so the network receives the
+        # arm state one exchange interval after the motor command that produced it
+        counts = [self.countCmdSpikes(i, t) for i in range(s.nMuscles)] if moving else [0]*s.nMuscles
+        if s.rank == 0: sent = counts + self.armState + [self.nextCritic]
+        else: sent = counts + [0]*len(self.armState) + [0]
+        exchangeStart = time()
+        s.pc.allreduce(self.vec.from_python(sent), 1) # sum
+        self.exchangeTimeAll.append(time()-exchangeStart)
+        received = self.vec.to_python()
+        if moving: self.motorCmd = received[:s.nMuscles]
+        dataReceived = received[s.nMuscles:-1]
+        critic = received[-1]
         if self.type == 'musculoskeletal':
-            [self.ang[SH], self.ang[EL]] = dataReceived
+            [self.ang[SH], self.ang[EL]] = dataReceived[:2]
             self.handPos = self.angles2pos(self.ang, self.armLen) 
             self.angVel[SH] = self.angVel[EL] = 0 
         else:
@@ -427,18 +432,61 @@ class Arm:
                 pass # local index corresponding to gid not found in this node
 
 
-        #### Calculate error between hand and target for interval between RL updates 
-        if s.rank == 0 and self.initArmMovement: # do not update between trials
-            #print 't=%.2f, xpos=%.2f'%(t,self.targetPos[X])
-            self.error = sqrt((self.handPos[X] - self.targetPos[X])**2 + (self.handPos[Y] - self.targetPos[Y])**2)
-            
-        return self.critic
+        ############################
+        # Worker 0: calculate final motor command, send it to virtual arm and receive new position (sent in the next exchange)
+        ############################
+        if s.rank == 0:
+            if moving:
+                self.motorCmd = [x / self.cmdmaxrate for x in self.motorCmd]  # normalize motor command 
+                if s.antagInh: # antagonist inhibition
+                    if self.motorCmd[SH_EXT] > self.motorCmd[SH_FLEX]: # sh ext > sh flex
+                        self.motorCmd[SH_FLEX] =  self.motorCmd[SH_FLEX]**2 / self.motorCmd[SH_EXT] / s.antagInh
+                    elif self.motorCmd[SH_EXT] < self.motorCmd[SH_FLEX]: # sh flex > sh ext
+                        self.motorCmd[SH_EXT] = self.motorCmd[SH_EXT]**2 / self.motorCmd[SH_FLEX] / s.antagInh
+                    if self.motorCmd[EL_EXT] > self.motorCmd[EL_FLEX]: # el ext > el flex
+                        self.motorCmd[EL_FLEX] = self.motorCmd[EL_FLEX]**2 / self.motorCmd[EL_EXT] / s.antagInh
+                    elif self.motorCmd[EL_EXT] < self.motorCmd[EL_FLEX]: # el ext > el flex
+                        self.motorCmd[EL_EXT] = self.motorCmd[EL_EXT]**2 / self.motorCmd[EL_FLEX] / s.antagInh
+
+            #print "t=%f , self.initArmMovement=%f"%(t, self.initArmMovement)
+            if self.type == 'musculoskeletal': # MUSCULOSKELETAL
+                try:
+                    dataReceived = arminterface.sendAndReceiveDataPackets(t, self.interval, self.motorCmd[0], self.motorCmd[1], self.motorCmd[2], self.motorCmd[3])
+                except:
+                    dataReceived = [self.ang[SH], self.ang[EL]]
+                if not dataReceived or dataReceived==[-3,3]:  # if error receiving packet
+                    dataReceived = [self.ang[SH], self.ang[EL]]  # use previous packet
+                    print 'Missed packet at t=%.2f',t
+                handPos = self.angles2pos(dataReceived, self.armLen)
+            elif self.type == 'dummyArm': # DUMMYARM
+                dataReceived = self.runDummyArm(self.motorCmd) # run dummyArm
+                handPos = dataReceived[4:6]
+            elif self.type == 'randomOutput': # RANDOMOUTPUT
+                dataReceived = [0,0] 
+                dataReceived[0] = uniform(self.minPval, self.maxPval) # generate 2 random values  
+                dataReceived[1] = uniform(self.minPval, self.maxPval)  
+                handPos = self.angles2pos(dataReceived, self.armLen)
+                dataReceived = dataReceived + [0, 0] + handPos # no angular velocities
+            self.armState = list(dataReceived) + [0]*(len(self.armState)-len(dataReceived)) # send to other workers in next exchange
+
+            #### Calculate error between hand and target for interval between RL updates 
+            if self.initArmMovement: # do not update between trials
+                #print 't=%.2f, xpos=%.2f'%(t,self.targetPos[X])
+                self.error = sqrt((handPos[X] - self.targetPos[X])**2 + (handPos[Y] - self.targetPos[Y])**2)
+            self.nextCritic = 0 # only sent once; set by RLcritic when it's time for RL
+
+        return critic # critic signal calculated by worker 0 at the last exchange
 
 
     ################################
     ### CLOSE
     ################################
     def close(self, s):             
+        if s.rank == 0 and len(self.cmdTimeAll) >= 10*s.nMuscles: # motor command counting time per step at the start and end of the run
+            nsteps = len(self.cmdTimeAll)/s.nMuscles
+            stepTimes = array(self.cmdTimeAll[:nsteps*s.nMuscles]).reshape(nsteps, s.nMuscles).sum(axis=1)
+            print('  Motor command time per arm step: %0.3f ms (first 10%% of steps), %0.3f ms (last 10%%)' % (1e3*mean(stepTimes[:nsteps/10]), 1e3*mean(stepTimes[-(nsteps/10):])))
+
         if self.type == 'randomOutput':
             print('\nClosing random output virtual arm...')
 
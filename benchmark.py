@@ -0,0 +1,466 @@
+"""
+BENCHMARK
+
+Benchmarks of parts of the model that are run many times.
+
+rlstep: cost of delivering one reward/punishment signal to the STDP mechanisms
+on this host for each predefined set of plastic connections (plastConnsType
+0-7), calling reward_punish() on each mechanism from Python vs. a single
+broadcast event from an RLSource (see rlsource.mod). The network is built once
+with plastConnsType=7, which contains every other set, and the STDP mechanisms
+of each set are picked out from it.
+
+lfpstep: cost of one LFP step (sum of the voltages of each LFP population) on
+this host, reading the voltage of each cell from Python vs. gathering them
+through a PtrVector per population (see network.setupLFPRecording). The number
+of cells grows with s.scale, so run it for each scale of interest.
+
+calibrate: calibration suite, with fixed seeds, whose results are saved to
+s.calibrationfile (JSON) and used by estimate() for the time estimates printed
+by createNetwork and runSim. For each scale in s.calibrationscales, a network
+of that many Izhi2007 cells with background input and random connections is
+built, to measure integration speed (izhistep, s per cell per ms), connection
+creation rate (connrate, s per gid_connect) and spike exchange rate
+(spikeexchange, s per spike). The model itself is then built at s.scale to
+measure connection calculation (conncalc, s per cell) and arm step latency
+(armstep, s per step). Results of other scales already in the file are kept,
+so the suite can be run once per machine and number of hosts.
+
+artcell: memory per cell and integration time per simulated second of the
+Izhikevich cells as Izhi2007a artificial cells (izhi2007a.mod) vs. Izhi2007
+point processes, each in a section of its own, at scales 8 and 20 (the cells
+of the model at that scale, with background input as for calibrate). Each
+measurement is run in a forked process, so memory freed by one is not reused
+by the next; serial runs only.
+
+integration: accuracy vs. speed of the integration methods of the Izhikevich
+cells (see izhi2007.inc), for each cell class: unconnected cells with
+background input, integrated with forward Euler (the default method) and the
+exponential method at several time steps, are compared with forward Euler at a
+fine step (0.002 ms). For each method and step it reports the spikes (as a
+percentage of the reference), the reference spikes matched by a spike within
+2 ms, the mean time difference of the matched spikes and the integration time
+per simulated second.
+
+exchange: spike exchange time per exchange (min/mean/max across hosts) and
+run time of a network of Izhikevich cells with background input and random
+connections (as for calibrate, at scale 8), with each set of spike exchange
+options of exchange.py: spike compression and bin queue (the latter only with
+artificialcells=False).
+Run it with each number of hosts of interest, e.g. 2, 8 and 32.
+
+threads: run time of the same network (at scale 8) on 1, 2 and 4 threads per
+host (pc.nthread, see s.nthreads), and its speedup over 1 thread. Run it on 1
+host and on N hosts to compare 1 host x N threads with N hosts x 1 thread (and
+the hybrids) on the same cores. The spikes differ slightly with threads: here
+every delay is a multiple of dt, so inputs often arrive at a cell at the same
+time as its reset after a spike, and those from other threads are delivered in
+the order the threads send them.
+
+Usage:
+    nrniv -python benchmark.py # Run all benchmarks
+    nrniv -python benchmark.py rlstep # Run only the RL step benchmark
+    nrniv -python benchmark.py lfpstep # Run only the LFP step benchmark
+    mpiexec -n 4 nrniv -mpi -python benchmark.py calibrate # Calibrate the time estimates for 4 hosts
+    nrniv -python benchmark.py artcell # Compare artificial cells and point processes
+    nrniv -python benchmark.py integration # Accuracy vs. speed of the integration methods
+    mpiexec -n 8 nrniv -mpi -python benchmark.py exchange # Spike exchange options on 8 hosts
+    nrniv -python benchmark.py threads # 1 host x 1, 2 and 4 threads; compare with mpiexec -n 4 ... threads
+
+Version: 2026oct18
+"""
+
+import os
+import sys
+import json
+import cPickle as pickle
+from os.path import exists
+from time import time
+from datetime import datetime
+from numpy import random
+from neuron import h, init
+import shared as s
+
+
+modelobjects = ['cells', 'dummies', 'pmdrands', 'spikerecorders', 'hostspikevecs', 'inncl', 'connlist', 'stdpmechs', 'precons', 'pstcons', 'rlsource', 'rltrigger', 'rlcons', 'sparestdps',
+                'stimrands', 'stimsources', 'stimconns', 'stimrecorders', 'stimspikevecs', 'stimtimevecs', 'stimweightvecs', 'tvecPMdlist',
+                'backgroundrands', 'backgroundsources', 'backgroundconns', 'backgroundrecorders', 'backgroundspikevecs', 'weightptrs', 'weightvec', 'lfpptrs', 'lfpvecs', 'rawrecordings'] # NEURON objects of the model kept in shared
+
+
+## Drop the model built by network.createNetwork (its gids and its NEURON objects), so that the next benchmark in this process can build it again
+def clearModel():
+    s.pc.gid_clear() # Before the cells and NetCons are deleted
+    for name in modelobjects:
+        if hasattr(s, name): delattr(s, name)
+
+
+## Time one reward/punishment step for each set of plastic connections
+def rlstep(plastConnsTypes=range(8), nreps=100):
+    import network
+    s.usestdp = True
+    s.useRL = True
+    s.plastConnsType = 7
+    network.createNetwork()
+    s.pc.set_maxstep(10)
+    init()
+    prepops = s.cellpops[[pre for pre,pst,r in s.stdpconndata]]
+    pstpops = s.cellpops[[pst for pre,pst,r in s.stdpconndata]]
+
+    for rep in range(int(100/h.dt)): s.pc.psolve(h.t+h.dt) # Skip the initial transient
+
+    print('\nRL step cost on host %i (mean of %i steps):' % (s.rank, nreps))
+    print('  %4s %8s %12s %12s %8s' % ('type', 'nSTDP', 'loop (ms)', 'event (ms)', 'speedup'))
+    results = []
+    for plastConnsType in plastConnsTypes:
+        plastic = set([tuple(pair) for pair in network.plasticConns(plastConnsType)])
+        mechs = [mech for mech,pre,pst in zip(s.stdpmechs, prepops, pstpops) if (pre,pst) in plastic]
+
+        ## Python loop over the mechanisms
+        loopstart = time()
+        for rep in range(nreps):
+            for stdp in mechs: stdp.reward_punish(1.0)
+        looptime = (time()-loopstart)/nreps
+
+        ## Single event relayed to the mechanisms -- cost of the step minus the baseline step
+        rlsource = h.RLSource()
+        rltrigger = h.NetCon(None, rlsource)
+        rlcons = [h.NetCon(rlsource, stdp) for stdp in mechs]
+        for rlcon in rlcons: rlcon.delay = 0; rlcon.weight[1] = 1
+        h.reinforcement_STDP = 1.0
+        eventtime = 0
+        for rep in range(nreps): # Alternate steps with and without a reward, and take the difference
+            stepstart = time()
+            s.pc.psolve(h.t+h.dt)
+            steptime = time()-stepstart
+            rltrigger.event(h.t)
+            stepstart = time()
+            s.pc.psolve(h.t+h.dt)
+            eventtime += (time()-stepstart-steptime)/nreps
+        eventtime = max(eventtime, 0)
+        del rlcons, rltrigger, rlsource
+
+        print('  %4i %8i %12.3f %12.3f %8.1f' % (plastConnsType, len(mechs), looptime*1e3, eventtime*1e3, looptime/max(eventtime,1e-9)))
+        results.append([plastConnsType, len(mechs), looptime, eventtime])
+    del mechs
+    clearModel()
+    return results
+
+
+## Time one LFP step with the Python loop over cells vs. the gathered voltages
+def lfpstep(nreps=100):
+    import network
+    s.savelfps = True
+    s.useArm = 'None'
+    network.createNetwork()
+    network.setupSim()
+    h.CVode().cache_efficient(1) # As in runSim
+    s.pc.set_maxstep(10)
+    init()
+    network.setupLFPRecording()
+    s.pc.psolve(100) # Skip the initial transient so voltages differ
+
+    ## Python loop over the cells
+    loopstart = time()
+    for rep in range(nreps):
+        looplfps = [0]*s.nlfps
+        for pop in range(s.nlfps):
+            for gid in s.lfpcellids[pop]: looplfps[pop] += s.cells[s.gidDic[gid]].V
+    looptime = (time()-loopstart)/nreps
+
+    ## Voltages gathered through a PtrVector per population
+    gatherstart = time()
+    for rep in range(nreps): network.recordLFP(h.t)
+    gathertime = (time()-gatherstart)/nreps
+    error = max(abs(s.hostlfps[-1]-looplfps))
+
+    print('\nLFP step cost on host %i at scale %i (%i cells; mean of %i steps):' % (s.rank, s.scale, sum([len(ids) for ids in s.lfpcellids]), nreps))
+    print('  %12s %12s %8s %10s' % ('loop (ms)', 'gather (ms)', 'speedup', 'max diff'))
+    print('  %12.3f %12.3f %8.1f %10.2g' % (looptime*1e3, gathertime*1e3, looptime/max(gathertime,1e-9), error))
+    clearModel()
+    return [looptime, gathertime]
+
+
+## Build ncells Izhikevich cells with background input, distributed round-robin, independently of the model's scale -- artificial cells or point processes as set by s.artificialcells, unless given
+def syntheticCells(ncells, seed=1, artificial=None, cellclass=None):
+    if artificial is None: artificial = s.artificialcells
+    cells = {'cells':[], 'dummies':[], 'sources':[], 'rands':[], 'conns':[], 'recorders':[], 'spikevecs':[]}
+    for gid in range(s.rank, ncells, s.nhosts):
+        dummy = None if artificial else h.Section()
+        if cellclass: cell = cellclass(dummy, cellid=gid)
+        else: cell = s.FS(dummy, cellid=gid) if gid%5==4 else s.RS(dummy, cellid=gid) # One interneuron in five
+        cell.method = int(s.integration == 'exponential')
+        rand = h.Random()
+        rand.MCellRan4(gid+1, seed)
+        rand.negexp(1)
+        source = h.NetStim()
+        source.interval = s.backgroundrate**-1*1e3
+        source.noiseFromRandom(rand)
+        source.noise = s.backgroundnoise
+        source.number = s.backgroundnumber
+        source.start = 0
+        conn = h.NetCon(source, cell)
+        for r in range(s.nreceptors): conn.weight[r] = 0
+        conn.weight[s.backgroundreceptor] = s.backgroundweight[0]
+        conn.delay = 2
+        s.pc.set_gid2node(gid, s.rank)
+        recorder = h.NetCon(cell, None)
+        spikevec = h.Vector()
+        recorder.record(spikevec)
+        s.pc.cell(gid, recorder)
+        for key,obj in zip(['dummies','cells','rands','sources','conns','recorders','spikevecs'], [dummy,cell,rand,source,conn,recorder,spikevec]): cells[key].append(obj)
+    return cells
+
+
+## Connect the synthetic cells to connspercell random presynaptic cells each, with the minimum delay
+def syntheticConns(cells, ncells, connspercell, seed=1):
+    rand = random.RandomState(seed)
+    for cell,pstgid in zip(cells['cells'], range(s.rank, ncells, s.nhosts)):
+        rand.seed(seed+pstgid) # Same connections for any number of hosts
+        for pregid in rand.randint(0, ncells, connspercell):
+            conn = s.pc.gid_connect(int(pregid), cell)
+            conn.weight[0] = 0.5*s.scaleconnweight[0][0]
+            conn.delay = s.mindelay
+            cells['conns'].append(conn)
+
+
+## Integration speed, connection creation rate and spike exchange rate of a network of Izhikevich cells at each scale
+def scaling(scales=None, duration=200, connspercell=25, seed=1):
+    scales = scales or s.calibrationscales
+    results = {'izhistep':{}, 'connrate':{}, 'spikeexchange':{}}
+    if s.rank==0: print('\nScaling on %i hosts (%i ms; %i connections per cell):' % (s.nhosts, duration, connspercell))
+    if s.rank==0: print('  %5s %7s %16s %16s %16s' % ('scale', 'cells', 'us per cell-ms', 'us per conn', 'us per spike'))
+    for scale in scales:
+        ncells = int(scale*sum(s.popratios)) # As the model at this scale
+        cells = syntheticCells(ncells, seed)
+        s.pc.set_maxstep(10)
+        init()
+
+        ## Integration of unconnected cells
+        s.pc.barrier()
+        runstart = time()
+        s.pc.psolve(duration)
+        izhitime = s.pc.allreduce(time()-runstart, 2)
+
+        ## Connections to random presynaptic cells
+        s.pc.barrier()
+        connstart = time()
+        syntheticConns(cells, ncells, connspercell, seed)
+        conntime = s.pc.allreduce(time()-connstart, 2)
+
+        ## Spikes exchanged between hosts while integrating the connected network
+        init()
+        waittime = s.pc.wait_time()
+        s.pc.psolve(duration)
+        waittime = s.pc.allreduce(s.pc.wait_time()-waittime, 2)
+        totalspikes = s.pc.allreduce(sum([vec.size() for vec in cells['spikevecs']]), 1)
+
+        results['izhistep'][str(scale)] = {'ncells':ncells, 'duration':duration, 'time':izhitime, 'cost':izhitime/(float(ncells)/s.nhosts*duration)}
+        results['connrate'][str(scale)] = {'nconnections':ncells*connspercell, 'time':conntime, 'cost':conntime/(float(ncells)/s.nhosts*connspercell)}
+        results['spikeexchange'][str(scale)] = {'nspikes':totalspikes, 'nexchanges':int(duration/s.mindelay), 'time':waittime, 'cost':waittime/max(totalspikes,1)}
+        if s.rank==0: print('  %5s %7i %16.3f %16.3f %16.3f' % (scale, ncells, 1e6*results['izhistep'][str(scale)]['cost'], 1e6*results['connrate'][str(scale)]['cost'], 1e6*results['spikeexchange'][str(scale)]['cost']))
+        s.pc.gid_clear()
+        del cells
+    return results
+
+
+## Connection calculation time and arm step latency of the model at s.scale
+def modelstep(nsteps=50):
+    import network
+    import profiler
+    s.useArm = 'dummyArm'
+    s.animArm = 0
+    s.graphsArm = 0
+    s.duration = nsteps*s.armExchangeInterval
+    s.trialTargets = [s.targetid]*2 # A single trial
+    network.createNetwork()
+    network.addStimulation()
+    network.addBackground()
+    network.setupSim()
+    h.CVode().cache_efficient(1) # As in runSim
+    s.pc.set_maxstep(10)
+    init()
+    steptimes = []
+    while round(h.t) < s.duration:
+        s.pc.psolve(h.t+s.armExchangeInterval)
+        stepstart = time()
+        s.arm.run(h.t, s)
+        steptimes.append(time()-stepstart)
+    s.arm.close(s)
+    conncalctime = s.pc.allreduce(profiler.times['conncalc'], 2)
+    steptime = s.pc.allreduce(sum(steptimes)/len(steptimes), 2)
+    if s.rank==0: print('\nModel at scale %i on %i hosts: connection calculation %0.3f ms per cell; arm step %0.3f ms' % (s.scale, s.nhosts, 1e3*conncalctime/(float(s.ncells)/s.nhosts), 1e3*steptime))
+    clearModel()
+    return {'conncalc':{str(s.scale):{'ncells':s.ncells, 'time':conncalctime, 'cost':conncalctime/(float(s.ncells)/s.nhosts)}},
+            'armstep':{str(s.scale):{'nsteps':nsteps, 'time':steptime*nsteps, 'cost':steptime}}}
+
+
+## Run the calibration suite and add the results to s.calibrationfile
+def calibrate():
+    results = scaling()
+    results.update(modelstep())
+    if s.rank==0:
+        calibration = loadCalibration() or {}
+        if calibration.get('info', {}).get('nhosts') != s.nhosts: calibration = {} # Only comparable with the same number of hosts
+        for name in results: calibration.setdefault(name, {}).update(results[name])
+        calibration['info'] = {'timestamp':datetime.today().strftime("%d %b %Y %H:%M:%S"), 'nhosts':s.nhosts}
+        with open(s.calibrationfile, 'w') as f: json.dump(calibration, f, indent=1, sort_keys=True)
+        print('  Saved to %s' % s.calibrationfile)
+    return results
+
+
+def loadCalibration():
+    if not exists(s.calibrationfile): return None
+    with open(s.calibrationfile) as f: return json.load(f)
+
+
+## Estimated time (s) on each host of n units of a calibrated quantity (e.g. estimate('connrate', nconnections)), from the scale closest to s.scale; None if not calibrated
+def estimate(name, n):
+    calibration = loadCalibration()
+    if calibration is None or not calibration.get(name): return None
+    scale = min(calibration[name], key=lambda key: abs(float(key)-s.scale))
+    return calibration[name][scale]['cost']*n
+
+
+## Resident memory of this process, in bytes
+def residentMemory():
+    with open('/proc/self/statm') as f: return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+
+
+## Memory per cell and integration time per simulated second of Izhi2007a artificial cells vs. Izhi2007 point processes in sections
+def artcell(scales=[8, 20], duration=1000, seed=1):
+    if s.nhosts > 1: # Forking is not safe with MPI
+        if s.rank==0: print('\nArtificial cells vs. point processes: skipped, since it can only be run serially')
+        return None
+    print('\nArtificial cells vs. point processes (%i ms):' % duration)
+    print('  %5s %7s %15s %14s %14s %9s' % ('scale', 'cells', 'cell', 'kB per cell', 's per sim s', 'spikes'))
+    results = {}
+    for scale in scales:
+        ncells = int(scale*sum(s.popratios)) # As the model at this scale
+        for artificial in [False, True]:
+            readfd, writefd = os.pipe()
+            pid = os.fork()
+            if pid == 0: # Forked process: build and run the cells, send the result back and exit
+                os.close(readfd)
+                memstart = residentMemory()
+                cells = syntheticCells(ncells, seed, artificial)
+                memory = residentMemory()-memstart
+                s.pc.set_maxstep(10)
+                init()
+                runstart = time()
+                s.pc.psolve(duration)
+                runtime = time()-runstart
+                result = {'memory':memory/float(ncells), 'time':runtime/duration*1e3, 'nspikes':sum([vec.size() for vec in cells['spikevecs']])}
+                with os.fdopen(writefd, 'wb') as f: pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+                os._exit(0)
+            os.close(writefd)
+            with os.fdopen(readfd, 'rb') as f: result = f.read()
+            if os.waitpid(pid, 0)[1] or not result: raise Exception('Measurement at scale %i failed' % scale)
+            result = pickle.loads(result)
+            name = 'Izhi2007a' if artificial else 'Izhi2007'
+            results.setdefault(name, {})[str(scale)] = result
+            print('  %5i %7i %15s %14.2f %14.2f %9i' % (scale, ncells, name, result['memory']/1e3, result['time'], result['nspikes']))
+    return results
+
+
+## Accuracy vs. speed of the integration methods for each cell class, compared with forward Euler at refdt
+def integration(cellclasses=['RS', 'IB', 'CH', 'LTS', 'FS', 'TC', 'RTN'], methods=[('euler', 0.5), ('euler', 1.0), ('exponential', 0.5), ('exponential', 1.0), ('exponential', 2.0)], refdt=0.002, ncells=50, duration=1000, window=2, seed=1):
+    if s.nhosts > 1: # Cells of one host only
+        if s.rank==0: print('\nIntegration methods: skipped, since it can only be run serially')
+        return None
+    dtsave, integrationsave = h.dt, s.integration
+    print('\nIntegration methods vs. forward Euler at dt = %g ms (%i cells per class; %i ms):' % (refdt, ncells, duration))
+    print('  %5s %11s %6s %8s %10s %9s %12s %12s' % ('class', 'method', 'dt', 'spikes', '% of ref', 'matched', 'mean dt (ms)', 's per sim s'))
+    results = {}
+    for cellclass in cellclasses:
+        for method,dt in [('euler', refdt)] + methods:
+            h.dt = dt
+            s.integration = method
+            cells = syntheticCells(ncells, seed, cellclass=getattr(s, cellclass))
+            s.pc.set_maxstep(10)
+            init()
+            runstart = time()
+            s.pc.psolve(duration)
+            runtime = time()-runstart
+            spikes = [vec.to_python() for vec in cells['spikevecs']]
+            s.pc.gid_clear()
+            del cells
+            if dt == refdt:
+                refspikes = spikes
+                nref = sum([len(train) for train in refspikes])
+                continue
+            nspikes = sum([len(train) for train in spikes])
+            diffs = [min([abs(spike-refspike) for spike in train]) for train,reftrain in zip(spikes, refspikes) for refspike in reftrain if train] # Nearest spike to each reference spike
+            matched = [diff for diff in diffs if diff <= window]
+            result = {'nspikes':nspikes, 'nref':nref, 'rate':100.0*nspikes/max(nref,1), 'matched':100.0*len(matched)/max(nref,1),
+                      'timing':sum(matched)/max(len(matched),1), 'time':runtime/duration*1e3}
+            results.setdefault(cellclass, {}).setdefault(method, {})[str(dt)] = result
+            print('  %5s %11s %6.2f %8i %10.1f %8.1f%% %12.3f %12.3f' % (cellclass, method, dt, nspikes, result['rate'], result['matched'], result['timing'], result['time']))
+    h.dt, s.integration = dtsave, integrationsave
+    return results
+
+
+## Spike exchange time and run time of a connected network of Izhikevich cells for each set of spike exchange options (see exchange.py)
+def exchange(options=[{}, {'spikecompress':20}, {'binqueue':True}, {'spikecompress':20, 'binqueue':True}], scale=8, duration=1000, connspercell=25, seed=1):
+    import exchange as spikeexchange
+    ncells = int(scale*sum(s.popratios)) # As the model at this scale
+    cells = syntheticCells(ncells, seed)
+    syntheticConns(cells, ncells, connspercell, seed)
+    seqs = [rand.seq() for rand in cells['rands']]
+    saved = dict([(name, getattr(s, name)) for name in ['spikecompress', 'multisend', 'binqueue']])
+    if s.rank==0: print('\nSpike exchange on %i hosts (%i cells; %i connections per cell; %i ms):' % (s.nhosts, ncells, connspercell, duration))
+    results = []
+    for option in options:
+        name = ', '.join(['%s=%s' % item for item in sorted(option.items())]) or 'default'
+        if option.get('binqueue') and s.artificialcells: # See exchange.py
+            if s.rank==0: print('  %-50s skipped, since it needs artificialcells=False' % name)
+            continue
+        for var,value in saved.items(): setattr(s, var, option.get(var, value))
+        spikeexchange.configure()
+        for rand,seq in zip(cells['rands'], seqs): rand.seq(seq) # Same input for every option
+        init()
+        s.pc.barrier()
+        runstart, waittime = time(), s.pc.wait_time()
+        s.pc.psolve(duration)
+        runtime, waittime = s.pc.allreduce(time()-runstart, 2), s.pc.wait_time()-waittime
+        minper, meanper, maxper = spikeexchange.report(waittime, duration)
+        nspikes = int(s.pc.allreduce(sum([vec.size() for vec in cells['spikevecs']]), 1))
+        if s.rank==0: print('  %-50s spikes %7i; run time %6.2f s; exchange time per exchange: mean %7.1f us, max %7.1f us' % (name, nspikes, runtime, meanper*1e6, maxper*1e6))
+        results.append({'options':option, 'nspikes':nspikes, 'time':runtime, 'exchange':[minper, meanper, maxper], 'interval':s.exchangeinterval})
+    for var,value in saved.items(): setattr(s, var, value)
+    spikeexchange.configure()
+    s.pc.gid_clear()
+    return results
+
+
+## Run time of a connected network of Izhikevich cells on each number of threads per host (pc.nthread)
+def threads(nthreads=[1, 2, 4], scale=8, duration=1000, connspercell=25, seed=1):
+    ncells = int(scale*sum(s.popratios)) # As the model at this scale
+    cells = syntheticCells(ncells, seed)
+    syntheticConns(cells, ncells, connspercell, seed)
+    seqs = [rand.seq() for rand in cells['rands']]
+    if s.rank==0: print('\nThreads on %i hosts (%i cells; %i connections per cell; %i ms):' % (s.nhosts, ncells, connspercell, duration))
+    if s.rank==0: print('  %7s %6s %9s %12s %8s' % ('threads', 'cores', 'spikes', 'run time (s)', 'speedup'))
+    results = []
+    for n in nthreads:
+        s.pc.nthread(n) # NEURON's default partition of the cells
+        s.pc.set_maxstep(10)
+        for rand,seq in zip(cells['rands'], seqs): rand.seq(seq) # Same input for every number of threads
+        init()
+        s.pc.barrier()
+        runstart = time()
+        s.pc.psolve(duration)
+        runtime = s.pc.allreduce(time()-runstart, 2)
+        nspikes = int(s.pc.allreduce(sum([vec.size() for vec in cells['spikevecs']]), 1))
+        results.append({'nthreads':n, 'nspikes':nspikes, 'time':runtime})
+        if s.rank==0: print('  %7i %6i %9i %12.2f %8.2f' % (n, n*s.nhosts, nspikes, runtime, results[0]['time']/runtime))
+    s.pc.nthread(s.nthreads)
+    s.pc.gid_clear()
+    return results
+
+
+benchmarks = ['rlstep', 'lfpstep', 'calibrate', 'artcell', 'integration', 'exchange', 'threads']
+
+if __name__ == '__main__':
+    torun = [arg for arg in sys.argv[1:] if arg in benchmarks] or benchmarks
+    for name in torun: globals()[name]()
+    h.quit()
@@ -0,0 +1,152 @@
+"""
+CHECKPOINT
+
+Checkpoints of a running simulation, so a long training run that is stopped
+(e.g. a job that hits its walltime) can be resumed from the last checkpoint
+instead of starting again. With s.checkpointinterval, runSim saves a checkpoint
+every s.checkpointinterval ms (not at the end of the run); when it starts, it
+resumes from the checkpoint of the same run if there is one.
+
+Each host saves <stem>_checkpoint<host>.dat, the NEURON SaveState of the host
+(event queue, NetCon weights, states of the artificial cells), and
+<stem>_checkpoint<host>.pkl with everything SaveState leaves out: the variables
+of the Izhikevich cells and STDP mechanisms (ASSIGNED, not STATE), the weights
+of all connections, the random number streams of the inputs, the spikes and
+weights recorded so far, the arm and the RL, exchange and save timers of
+shared. The stem is s.outfilestem, so that runs with different output files
+(e.g. evolution candidates) don't share checkpoints, and numbers the runs of the
+process (train, test target 0, ...), so a rerun of the same script resumes each
+run from its own checkpoint.
+
+A checkpoint is only resumed if it was saved by the same network (hosts, cells,
+connections) and parameters (a hash of every parameter of shared); delete the
+files to start over. Inputs without
+their own Random (e.g. the NSLOC background of the motor command cells) draw
+from NEURON's global random stream, which is not saved, so a resumed run is
+statistically but not spike-for-spike identical to an uninterrupted one. The
+state of the external musculoskeletal arm is not saved either.
+
+Usage example:
+    nrniv -python main.py checkpointinterval=10000 # Rerun the same command to resume
+
+Version: 2026oct18
+"""
+
+from pylab import array
+from numpy import ndarray
+from time import time
+from neuron import h
+import cPickle as pickle
+import hashlib
+import os
+import shared as s
+
+stdpstate = ['tlastpre', 'tlastpost', 'tlasthebbelig', 'tlastantielig', 'interval', 'deltaw'] # State of each STDP mechanism
+izhistate = ['V', 'u', 'gAMPA', 'gNMDA', 'gGABAA', 'gGABAB', 'gOpsin', 'I', 't0', 'delta', 'factor', 'b'] # Variables of each Izhi2007 cell
+izhiastate = izhistate + ['above'] # Variables of each Izhi2007a cell
+sharedstate = ['timeoflastRL', 'timeoflastexchange', 'timeoflastsave', 'timeoflastexplor', 'timeoflaststream', 'timeoflastreset', 'timeoflastcheckpoint', 'targetid'] # Variables of shared that change during the run
+armskip = ['vec', 'cmdSpikeVecs', 'fig', 'ax', 'line', 'circle'] # Arm attributes that are NEURON or figure objects
+parameternames = sorted([name for name,value in vars(s).items() if not name.startswith('_') and isinstance(value, (bool, int, float, str, list, tuple, dict, ndarray))
+                         and name not in sharedstate + ['nruns', 'resuming', 'checkpointinterval', 'weightchanges']]) # Parameters defined by shared, hashed into the key of a checkpoint -- not the state of the run
+
+
+def checkpointFile(stem, host, ext):
+    return '%s_checkpoint%i.%s' % (stem, host, ext)
+
+
+## Variables of each Izhikevich cell
+def cellstate():
+    return izhiastate if s.artificialcells else izhistate
+
+
+## Filestem of the checkpoints of the current run
+def filestem():
+    return '%s_%s_run%i' % (s.outfilestem, s.checkpointfile, s.nruns)
+
+
+## Hash of the current values of the parameters of shared
+def parameterHash():
+    sha = hashlib.sha1()
+    for name in parameternames:
+        sha.update(name)
+        sha.update(pickle.dumps(getattr(s, name), pickle.HIGHEST_PROTOCOL))
+    return sha.hexdigest()
+
+
+## Settings a checkpoint must have been saved with to be resumed
+def checkpointKey():
+    return [s.nhosts, s.ncells, s.cellsperhost, s.nconnections, s.nstdpconns, parameterHash()]
+
+
+## Whether every host has a checkpoint of this run
+def exists(stem):
+    return bool(s.pc.allreduce(int(os.path.exists(checkpointFile(stem, s.rank, 'pkl'))), 3))
+
+
+## Save the state of this host; returns the time taken by the slowest host
+def save(stem):
+    savestart = time()
+    datfile, pklfile = checkpointFile(stem, s.rank, 'dat'), checkpointFile(stem, s.rank, 'pkl')
+    savestate = h.SaveState()
+    savestate.save()
+    statefile = h.File()
+    statefile.wopen(datfile+'.tmp')
+    savestate.fwrite(statefile) # Closes the file
+
+    izhicells = [cell for cell in s.cells if hasattr(cell, 'vpeak')]
+    state = {'key':checkpointKey(), 't':h.t,
+             'izhistate':array([[getattr(cell, var) for var in cellstate()] for cell in izhicells]),
+             'stdpstate':array([[getattr(mech, var) for var in stdpstate] for mech in getattr(s, 'stdpmechs', [])]),
+             'netconweights':array([[con.weight[r] for r in range(s.nreceptors)] for con in s.connlist]),
+             'randseqs':[rand.seq() for rand in getattr(s, 'backgroundrands', []) + getattr(s, 'stimrands', [])],
+             'spikes':[vec.as_numpy().copy() for vec in s.hostspikevecs],
+             'shared':dict([(var, getattr(s, var)) for var in sharedstate]),
+             'lfptime':s.lfptime, 'hostlfps':s.hostlfps}
+    if s.usestdp: state.update({'weightchanges':s.weightchanges, 'weighttimes':s.weighttimes, 'nweightsaves':s.nweightsaves})
+    if s.useArm != 'None': state['arm'] = dict([(key, value) for key,value in s.arm.__dict__.items() if key not in armskip])
+    if s.spikestreaminterval:
+        s.spikestream.flush()
+        state['spikestream'] = [s.spikestream.tell(), s.nstreamedspikes]
+    if s.tracelevel:
+        s.tracestream.flush()
+        state['trace'] = [s.tracestream.tell(), s.ntracerecords, s.ndroppedrecords]
+    with open(pklfile+'.tmp', 'wb') as f: pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    os.rename(datfile+'.tmp', datfile)
+    os.rename(pklfile+'.tmp', pklfile) # Last, so a checkpoint only exists once both files are complete
+    return s.pc.allreduce(time()-savestart, 2)
+
+
+## Resume from the checkpoint of this run -- after init(), which resets everything that isn't restored
+def restore(stem):
+    restorestart = time()
+    with open(checkpointFile(stem, s.rank, 'pkl'), 'rb') as f: state = pickle.load(f)
+    if s.pc.allreduce(int(state['key'] != checkpointKey()), 2):
+        raise Exception('Checkpoint %s was saved by a different network or parameters; delete %s to start over' % (stem, checkpointFile(stem, 0, '*').replace('checkpoint0', 'checkpoint*')))
+    savestate = h.SaveState()
+    statefile = h.File()
+    statefile.ropen(checkpointFile(stem, s.rank, 'dat'))
+    savestate.fread(statefile) # Closes the file
+    savestate.restore() # Replaces the event queue of init() with the saved one; sets h.t
+
+    for cell,values in zip([cell for cell in s.cells if hasattr(cell, 'vpeak')], state['izhistate'].tolist()):
+        for var,value in zip(cellstate(), values): setattr(cell, var, value)
+    for mech,values in zip(getattr(s, 'stdpmechs', []), state['stdpstate'].tolist()):
+        for var,value in zip(stdpstate, values): setattr(mech, var, value)
+    for con,weights in zip(s.connlist, state['netconweights'].tolist()):
+        for r in range(s.nreceptors): con.weight[r] = weights[r]
+    for rand,seq in zip(getattr(s, 'backgroundrands', []) + getattr(s, 'stimrands', []), state['randseqs']): rand.seq(seq)
+    for vec,spikes in zip(s.hostspikevecs, state['spikes']): vec.from_python(spikes)
+    for var,value in state['shared'].items(): setattr(s, var, value)
+    s.lfptime, s.hostlfps = state['lfptime'], state['hostlfps']
+    if s.usestdp: s.weightchanges, s.weighttimes, s.nweightsaves = state['weightchanges'], state['weighttimes'], state['nweightsaves']
+    if s.useArm != 'None': s.arm.__dict__.update(state['arm'])
+    if s.spikestreaminterval: # Drop spikes written to the log after the checkpoint (the log is kept by spikestream.start when resuming)
+        s.spikestream.truncate(state['spikestream'][0])
+        s.spikestream.seek(0, os.SEEK_END)
+        s.nstreamedspikes = state['spikestream'][1]
+    if s.tracelevel and 'trace' in state: # Likewise for the trace (kept by tracing.start)
+        s.tracestream.truncate(state['trace'][0])
+        s.tracestream.seek(0, os.SEEK_END)
+        s.ntracerecords, s.ndroppedrecords = state['trace'][1:]
+    s.pc.barrier()
+    if s.rank==0: print('  Resumed from checkpoint %s at t = %0.1f s; time = %0.1f s' % (stem, state['t']/1e3, time()-restorestart))
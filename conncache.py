@@ -0,0 +1,94 @@
+"""
+CONNCACHE
+
+On-disk cache of the connectivity calculated by createNetwork. Each host stores
+its own connections (s.conndata) in a compressed .npz file named by a hash of
+everything the connectivity depends on -- cell locations and populations,
+connection probabilities, weights and length constants, random seed, PMd input
+settings and host decomposition. A run (or evolutionary candidate) with the same
+network parameters loads its connections instead of recalculating them.
+
+The cache directory is limited to s.conncachesize bytes: when a new file is
+saved, the least recently used files (by modification time, which is updated
+on every hit) are deleted until it fits.
+
+Usage example:
+    import conncache
+    key = conncache.cacheKey()
+    s.conndata = conncache.load(key) # None on a miss
+    if s.conndata is None:
+        calculateConnections()
+        conncache.save(key, s.conndata)
+
+Version: 2026oct18
+"""
+
+from pylab import array
+from numpy import load as npload, savez_compressed
+from time import time
+import hashlib
+import os
+import shared as s
+
+
+## Hash of every parameter the connectivity of this host depends on
+def cacheKey():
+    pars = [s.randseed, s.scale, s.ncells, s.nhosts, s.rank, s.modelsize, s.toroidal, s.mindelay, s.velocity,
+            s.PMdinput, s.nMuscles, s.motorCmdStartCell, s.motorCmdEndCell, s.connbuilder, s.conntolerance, s.popnumbers.tolist(), 'pairrands'] # Last: random stream of the builders (see connectivity.pairRands)
+    if s.PMdinput == 'Plexon': pars.append(s.server.numPMd)
+    if s.loadbalance: pars.append(s.gidVec) # Cells of this host depend on the cost estimates
+    arrays = [s.xlocs, s.ylocs, s.zlocs, s.cellpops, s.EorI, s.connprobs, s.connweights, s.connfalloff, s.scaleconnprob, s.scaleconnweight, array(s.receptorweight)]
+    sha = hashlib.sha1(repr(pars))
+    for arr in arrays: sha.update(array(arr, dtype='float64').tostring())
+    return sha.hexdigest()
+
+
+def cacheFile(key):
+    return os.path.join(s.conncachedir, 'conn_%s.npz' % key)
+
+
+## Load the connections for this key, or return None if they're not in the cache
+def load(key):
+    filename = cacheFile(key)
+    loadstart = time()
+    try:
+        data = npload(filename)
+        conndata = [data['pre'], data['post'], data['distances'], data['delays'], data['weights']]
+        data.close()
+    except (IOError, KeyError):
+        print('  Connectivity cache miss on host %i (%s)' % (s.rank, key[:12]))
+        return None
+    try: os.utime(filename, None) # Mark as recently used
+    except OSError: pass
+    print('  Connectivity cache hit on host %i (%s); load time = %0.2f s' % (s.rank, key[:12], time()-loadstart))
+    return conndata
+
+
+## Save the connections for this key and evict the least recently used files
+def save(key, conndata):
+    if not os.path.isdir(s.conncachedir):
+        try: os.makedirs(s.conncachedir)
+        except OSError: pass # Another host created it
+    filename = cacheFile(key)
+    tmpfilename = filename[:-4] + '_tmp%i.npz' % s.rank
+    savez_compressed(tmpfilename, pre=conndata[0], post=conndata[1], distances=conndata[2], delays=conndata[3], weights=conndata[4])
+    os.rename(tmpfilename, filename) # Atomic, so other hosts never see a partial file
+    evict()
+
+
+## Delete the least recently used cache files until the cache fits in s.conncachesize bytes
+def evict():
+    files = []
+    for name in os.listdir(s.conncachedir):
+        if not (name.startswith('conn_') and name.endswith('.npz')) or '_tmp' in name: continue
+        try:
+            stat = os.stat(os.path.join(s.conncachedir, name))
+            files.append((stat.st_mtime, stat.st_size, name))
+        except OSError: pass # Evicted by another host
+    files.sort()
+    total = sum([size for mtime,size,name in files])
+    while len(files) > 1 and total > s.conncachesize: # Always keep the newest file
+        mtime, size, name = files.pop(0)
+        try: os.remove(os.path.join(s.conncachedir, name))
+        except OSError: pass
+        total -= size
@@ -0,0 +1,249 @@
+"""
+CONNECTIVITY
+
+Functions to calculate which presynaptic cells connect to each postsynaptic
+cell. Two builders are available, selected by s.connbuilder:
+- 'full': the original O(N^2) calculation -- distances and probabilities from
+  every cell in the network to each postsynaptic cell
+- 'grid': presynaptic cells are binned into a (toroidal) grid over the model
+  area, and only cells within a cutoff distance of the postsynaptic cell are
+  tested
+
+Both builders test each pair against its own random number, a hash of the
+random seed and the (postsynaptic, presynaptic) gids (see pairRands), so the
+cost of a builder is only the pairs it tests.
+
+Tolerance of the grid builder: the random numbers are the same as for the full
+builder, so every connection within the cutoff distance is identical. The cutoff is calculated separately for E and
+I presynaptic cells as connfalloff*log(pmax/conntolerance), where pmax is the
+largest connection probability factor for that class, so any pair beyond the
+cutoff has a connection probability below s.conntolerance. The expected number
+of connections lost per postsynaptic cell is therefore at most
+conntolerance*2*pi*falloff*(cutoff+falloff)*ncells/modelsize**2 -- about 0.005
+for scale=8 and the default conntolerance=1e-5.
+
+Cost: the full builder tests all N cells for each postsynaptic cell, O(N^2).
+The grid builder bins the cells once, O(N log N), then tests the cells in the
+bins within the cutoff, about N*pi*cutoff**2/modelsize**2 per postsynaptic cell
+(all N once the cutoff reaches modelsize/2). With modelsize fixed, as here,
+that is still O(N^2), only smaller by that area fraction -- about 0.3 for E and
+0.6 for I presynaptic cells with the default parameters, so the speedup is
+small; the wiring is only O(N) if modelsize grows with the number of cells.
+s.connbuildercheck reports the fraction actually tested.
+
+Usage example:
+    import connectivity
+    grids = connectivity.cellGrids()
+    preids = connectivity.gridPreIds(gid, grids)
+    distances, distances3d = connectivity.cellDistances(gid, preids)
+    store = connectivity.ConnStore(1000)
+    store.append(preids, postids, distances, delays, weights)
+    s.conndata = store.columns()
+
+Version: 2026oct18
+"""
+
+from pylab import sqrt, exp, log, array, arange, zeros, ceil, concatenate, argsort, searchsorted, minimum, sort, unique, setdiff1d, nonzero
+from numpy import memmap, uint64
+from time import time
+import os
+import shared as s
+
+
+###############################################################################
+### Distances
+###############################################################################
+
+## Calculate the 2d and 3d distances between a postsynaptic cell and a set of presynaptic cells
+def cellDistances(gid, preids):
+    if s.toroidal:
+        xpath=(abs(s.xlocs[preids]-s.xlocs[gid]))**2
+        xpath2=(s.modelsize-abs(s.xlocs[preids]-s.xlocs[gid]))**2
+        xpath[xpath2<xpath]=xpath2[xpath2<xpath]
+        ypath=(abs(s.ylocs[preids]-s.ylocs[gid]))**2
+        ypath2=(s.modelsize-abs(s.ylocs[preids]-s.ylocs[gid]))**2
+        ypath[ypath2<ypath]=ypath2[ypath2<ypath]
+        zpath=(abs(s.zlocs[preids]-s.zlocs[gid]))**2
+        distances = sqrt(xpath + ypath) # Calculate all pairwise distances
+        distances3d = sqrt(xpath + ypath + zpath) # Calculate all pairwise 3d distances
+    else:
+        distances = sqrt((s.xlocs[preids]-s.xlocs[gid])**2 + (s.ylocs[preids]-s.ylocs[gid])**2) # Calculate all pairwise distances
+        distances3d = sqrt((s.xlocs[preids]-s.xlocs[gid])**2 + (s.ylocs[preids]-s.ylocs[gid])**2 + (s.zlocs[preids]-s.zlocs[gid])**2) # Calculate all pairwise distances
+    return distances, distances3d
+
+
+## Probability of connecting each of the presynaptic cells to a postsynaptic cell
+def connProbs(gid, preids, distances):
+    return s.scaleconnprob[s.EorI[preids],s.EorI[gid]] * s.connprobs[s.cellpops[preids],s.cellpops[gid]] * exp(-distances/s.connfalloff[s.EorI[preids]])
+
+
+## SplitMix64 finalizer: scrambles the bits of an array of uint64s
+def mix64(z):
+    z = (z ^ (z >> uint64(30))) * uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> uint64(27))) * uint64(0x94D049BB133111EB)
+    return z ^ (z >> uint64(31))
+
+
+## Uniform random number in [0,1) for each pair (gid, preid), set by s.randseed and the pair alone
+def pairRands(gid, preids):
+    key = mix64(mix64(array([s.randseed], dtype='uint64')) + uint64(gid)) # Stream of this postsynaptic cell
+    z = mix64(array(preids, dtype='uint64')*uint64(0x9E3779B97F4A7C15) + key)
+    return (z >> uint64(11)) * 2.0**-53 # Top 53 bits
+
+
+###############################################################################
+### Full builder
+###############################################################################
+
+## Presynaptic cell IDs for a postsynaptic cell, testing every cell in the network
+def fullPreIds(gid):
+    allids = arange(s.ncells)
+    distances, distances3d = cellDistances(gid, allids)
+    allconnprobs = connProbs(gid, allids, distances) # Calculate pairwise probabilities
+    allconnprobs[gid] = 0 # Prohibit self-connections using the cell's GID
+    allrands = pairRands(gid, allids) # Create an array of random numbers for checking each connection
+    if s.PMdinput == 'Plexon':
+        for c in xrange(s.popGidStart[s.PMd], s.popGidEnd[s.PMd] + 1):
+            allrands[c] = 1
+        if s.cellnames[gid] == 'ER5': # PMd->ER5 conn (full conn)
+            PMdId = (gid % s.server.numPMd) + s.ncells - s.server.numPMd #CHECK THIS!
+            allconnprobs[PMdId] = s.connprobs[s.PMd,s.ER5] # to make this connected to ER5
+            allrands[PMdId] = 0 # to make this connect to ER5
+    makethisconnection = allconnprobs>allrands # Perform test to see whether or not this connection should be made
+    preids = array(makethisconnection.nonzero()[0],dtype='int') # Return True elements of that array for presynaptic cell IDs
+    return preids
+
+
+###############################################################################
+### Grid builder
+###############################################################################
+
+## Cutoff distance beyond which connection probabilities are below s.conntolerance, for E and I presynaptic cells
+def connCutoff():
+    cutoff = zeros(2)
+    postEorI = array(s.popEorI)
+    for EorI in range(2):
+        prepops = nonzero(array(s.popEorI)==EorI)[0]
+        pmax = max([(s.scaleconnprob[EorI,postEorI] * s.connprobs[pre,:]).max() for pre in prepops])
+        if pmax > s.conntolerance: cutoff[EorI] = s.connfalloff[EorI]*log(pmax/s.conntolerance)
+    return cutoff
+
+
+## Bin the cells of each class (E or I) into a square grid with bins small enough to approximate a circle of radius cutoff
+class CellGrid:
+    def __init__(self, ids, cutoff, binsperradius=4):
+        self.cutoff = cutoff
+        self.nbins = max(1, min(1000, int(s.modelsize*binsperradius/max(cutoff,1e-9)))) # Number of bins along each side
+        self.binsize = s.modelsize/float(self.nbins)
+        self.reach = int(ceil(cutoff/self.binsize)) # Number of neighbouring bins to search on each side
+        self.allbins = (2*self.reach+1 >= self.nbins) # Cutoff covers the whole model, so just return every cell
+        binids = self.bin(s.xlocs[ids])*self.nbins + self.bin(s.ylocs[ids])
+        order = argsort(binids, kind='mergesort')
+        self.ids = array(ids)[order] # Cell IDs sorted by bin
+        self.starts = searchsorted(binids[order], arange(self.nbins**2+1)) # Index of the first cell of each bin
+
+    def bin(self, locs):
+        return minimum(array(locs/self.binsize, dtype='int'), self.nbins-1)
+
+    ## IDs of all cells in bins within the cutoff distance from location (x,y)
+    def near(self, x, y):
+        if self.allbins: return self.ids
+        bx, by = self.bin(x), self.bin(y)
+        ylo, yhi = by-self.reach, by+self.reach
+        if s.toroidal: # Split the y range where it wraps around the edge
+            if ylo < 0: yranges = [(0, yhi), (ylo+self.nbins, self.nbins-1)]
+            elif yhi >= self.nbins: yranges = [(ylo, self.nbins-1), (0, yhi-self.nbins)]
+            else: yranges = [(ylo, yhi)]
+            xbins = [xb % self.nbins for xb in range(bx-self.reach, bx+self.reach+1)]
+        else:
+            yranges = [(max(ylo,0), min(yhi,self.nbins-1))]
+            xbins = range(max(bx-self.reach,0), min(bx+self.reach,self.nbins-1)+1)
+        chunks = [self.ids[self.starts[xb*self.nbins+y0]:self.starts[xb*self.nbins+y1+1]] for xb in xbins for (y0,y1) in yranges]
+        return concatenate(chunks)
+
+
+## Create one grid of presynaptic candidates for E cells and one for I cells
+def cellGrids():
+    cutoff = connCutoff()
+    presyn = setdiff1d(arange(s.ncells), nonzero(s.connprobs.sum(axis=1)[s.cellpops]==0)[0]) # Skip cells that never project anywhere
+    if s.PMdinput == 'Plexon': presyn = presyn[s.cellpops[presyn] != s.PMd] # Plexon PMd inputs are connected separately
+    grids = [CellGrid(presyn[s.EorI[presyn]==EorI], cutoff[EorI]) for EorI in range(2)]
+    if s.rank==0: print('  Grid cutoff distance: %0.0f um (E), %0.0f um (I); %i x %i bins' % (cutoff[0], cutoff[1], grids[0].nbins, grids[1].nbins))
+    return grids
+
+
+## Presynaptic cell IDs for a postsynaptic cell, testing only cells within the cutoff distance
+def gridPreIds(gid, grids):
+    candidates = concatenate([grid.near(s.xlocs[gid], s.ylocs[gid]) for grid in grids])
+    distances, distances3d = cellDistances(gid, candidates)
+    makethisconnection = (connProbs(gid, candidates, distances) > pairRands(gid, candidates)) * (candidates != gid) # Same random numbers as the full builder; prohibit self-connections
+    preids = sort(candidates[makethisconnection])
+    if s.PMdinput == 'Plexon' and s.cellnames[gid] == 'ER5' and s.connprobs[s.PMd,s.ER5] > 0: # PMd->ER5 conn (full conn)
+        PMdId = (gid % s.server.numPMd) + s.ncells - s.server.numPMd
+        preids = unique(concatenate([preids, [PMdId]]))
+    return array(preids, dtype='int')
+
+
+###############################################################################
+### Compare builders
+###############################################################################
+
+## Time both builders on the postsynaptic cells of this host and count differing connections
+def compareBuilders(postgids):
+    fullstart = time()
+    fullpre = [fullPreIds(gid) for gid in postgids]
+    fulltime = time()-fullstart
+    gridstart = time()
+    grids = cellGrids()
+    gridpre = [gridPreIds(gid, grids) for gid in postgids]
+    gridtime = time()-gridstart
+    ntested = sum([len(grid.near(s.xlocs[gid], s.ylocs[gid])) for gid in postgids for grid in grids]) # Pairs tested by the grid builder
+    ndiff = sum([len(setdiff1d(f, g)) + len(setdiff1d(g, f)) for f,g in zip(fullpre, gridpre)])
+    nconns = sum([len(f) for f in fullpre])
+    print('  Connectivity builders on host %i: full = %0.2f s, grid = %0.2f s (speedup x%0.1f, testing %0.0f%% of the pairs); %i of %i connections differ' % (s.rank, fulltime, gridtime, fulltime/max(gridtime,1e-9), 100.*ntested/max(len(postgids)*s.ncells,1), ndiff, nconns))
+    return fulltime, gridtime, ndiff
+
+
+###############################################################################
+### Connection store
+###############################################################################
+
+## Preallocated columnar storage for connections: int32 pre and post cell IDs, float32 distances, delays and NxM weights
+class ConnStore:
+    names = ['pre', 'post', 'distances', 'delays', 'weights']
+    dtypes = ['int32', 'int32', 'float32', 'float32', 'float32']
+
+    def __init__(self, capacity, filestem=None):
+        self.n = 0 # Number of connections stored
+        self.filestem = filestem # If given, columns are numpy.memmap files called filestem_<name>.dat
+        self.cols = [None]*len(self.names)
+        self.allocate(max(int(capacity),1))
+
+    def shape(self, c, capacity):
+        return (capacity, s.nreceptors) if self.names[c] == 'weights' else (capacity,)
+
+    ## (Re)allocate all columns with room for capacity connections, keeping the ones already stored
+    def allocate(self, capacity):
+        for c in range(len(self.names)):
+            if self.filestem is None:
+                col = zeros(self.shape(c, capacity), dtype=self.dtypes[c])
+                if self.n: col[:self.n] = self.cols[c][:self.n]
+            else:
+                filename = '%s_%s.dat' % (self.filestem, self.names[c])
+                col = memmap(filename+'.tmp', dtype=self.dtypes[c], mode='w+', shape=self.shape(c, capacity))
+                if self.n: col[:self.n] = self.cols[c][:self.n]
+                self.cols[c] = None # Close the old file before replacing it
+                os.rename(filename+'.tmp', filename)
+            self.cols[c] = col
+        self.capacity = capacity
+
+    ## Copy connections into the store, doubling its capacity if needed
+    def append(self, pre, post, distances, delays, weights):
+        n = len(pre)
+        if self.n + n > self.capacity: self.allocate(max(2*self.capacity, self.n+n))
+        for col,data in zip(self.cols, [pre, post, distances, delays, weights]): col[self.n:self.n+n] = data
+        self.n += n
+
+    ## Views of the stored connections, in the same order as s.conndata -- no data is copied
+    def columns(self):
+        return [col[:self.n] for col in self.cols]
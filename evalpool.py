@@ -0,0 +1,142 @@
+"""
+EVALPOOL
+
+Persistent pool of simulation workers for the evolutionary algorithm
+(evol_islands.py). Instead of a new nrniv process per candidate -- each paying
+for NEURON startup, loading the mechanisms and importing shared and network --
+a Pool starts its worker processes (nrniv -python evalpool.py) once and sends
+them candidates over a local socket. A candidate is a dict of variables of
+shared to set, as on the command line of main.py. For each candidate a worker
+resets shared to its defaults, sets the variables, builds, trains and tests
+the network with network.runTrainTest2targetsOptim and sends back the error
+dict it saved to <outfilestem>_target_0_error. The network is still built for
+every candidate, since the parameters change the connectivity.
+
+Pool.evaluate returns the results in the order of the candidates, and prints
+the throughput in evaluations per hour, as parallel_evaluation_pbs does for
+its sbatch jobs, so the two can be compared.
+
+Usage example:
+    import evalpool
+    pool = evalpool.Pool(4)
+    results = pool.evaluate([{'trainTime':30e3, 'stdpwin':20, 'outfilestem':'../data/gen_0_cand_0'}, ...])
+    pool.close()
+
+Version: 2026oct18
+"""
+
+from multiprocessing.connection import Listener, Client
+from time import time
+import os
+import subprocess
+import threading
+import traceback
+import Queue
+
+workercommand = ['nrniv', '-python', 'evalpool.py'] # Command that starts a worker, run in the directory of the model
+addressenv, authkeyenv = 'EVALPOOL_ADDRESS', 'EVALPOOL_AUTHKEY' # Environment variables that tell a worker how to connect to its pool
+
+
+class Pool(object):
+    def __init__(self, numworkers, command=workercommand):
+        self.command = command
+        self.authkey = os.urandom(16) # Only processes started by this pool can connect
+        self.listener = Listener(('localhost', 0), authkey=self.authkey)
+        self.lock = threading.Lock() # Workers are started one at a time, so each accept() gets the worker just started
+        self.workers = [self.startWorker() for w in range(numworkers)] # Process and connection of each worker
+        self.nevaluations = 0 # Evaluations so far
+        self.evaltime = 0.0 # Time spent evaluating so far
+
+    ## Start a worker process and wait for it to connect
+    def startWorker(self):
+        with self.lock:
+            env = dict(os.environ)
+            env[addressenv] = '%s:%i' % self.listener.address
+            env[authkeyenv] = self.authkey.encode('hex')
+            process = subprocess.Popen(self.command, env=env)
+            return [process, self.listener.accept()]
+
+    ## Evaluate the candidates on all workers; returns the result of each candidate, or default for those that failed
+    def evaluate(self, candidates, default=None):
+        evalstart = time()
+        jobs = Queue.Queue()
+        for i,candidate in enumerate(candidates): jobs.put((i, candidate))
+        results = [default]*len(candidates)
+        threads = [threading.Thread(target=self.runJobs, args=(w, jobs, results)) for w in range(len(self.workers))]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+
+        evaltime = time()-evalstart
+        self.nevaluations += len(candidates)
+        self.evaltime += evaltime
+        print('%i evaluations in %0.1f s on %i workers: %0.1f evaluations per hour (%0.1f so far)' % (len(candidates), evaltime, len(self.workers), len(candidates)/evaltime*3600, self.nevaluations/self.evaltime*3600))
+        return results
+
+    ## Send candidates to worker w until there are none left
+    def runJobs(self, w, jobs, results):
+        while True:
+            try: i,candidate = jobs.get(block=False)
+            except Queue.Empty: return
+            try:
+                self.workers[w][1].send(candidate)
+                ok, result = self.workers[w][1].recv()
+                if ok: results[i] = result
+                else: print('Candidate %i failed on worker %i:\n%s' % (i, w, result))
+            except (EOFError, IOError): # The worker died (e.g. a crash in NEURON), so start a new one
+                print('Worker %i died evaluating candidate %i; starting a new worker' % (w, i))
+                self.workers[w][0].wait()
+                self.workers[w] = self.startWorker()
+
+    ## Stop the workers
+    def close(self):
+        for process,conn in self.workers:
+            try: conn.send(None)
+            except IOError: pass
+            process.wait()
+        self.listener.close()
+
+
+## Return shared to its state after import, dropping the network of the previous candidate
+def reset():
+    from pylab import close
+    from neuron import h
+    import gc
+    import shared as s
+    import profiler
+    s.pc.gid_clear() # Before the cells and NetCons are deleted
+    for name in [name for name in vars(s) if not name.startswith('__')]: delattr(s, name) # reload() keeps variables it doesn't define
+    reload(s)
+    h.NSLOC().seed(1) # NEURON's global random stream (used by inputs without their own Random) from the start, as in a new process
+    h.reinforcement_STDP = 0 # Global of stdp.mod, set by the RL of the previous candidate
+    profiler.times.clear()
+    profiler.counts.clear()
+    close('all') # Figures saved by the previous candidate
+    gc.collect()
+
+
+## Evaluate the candidates sent by the pool until it sends None
+def work(address, authkey):
+    import shared as s
+    import network
+    conn = Client(address, authkey=authkey)
+    while True:
+        candidate = conn.recv()
+        if candidate is None: break
+        try:
+            reset()
+            for name,value in candidate.items():
+                if not hasattr(s, name): raise Exception('Candidate variable "%s" not found' % name)
+                setattr(s, name, value)
+            result = (True, network.runTrainTest2targetsOptim(wrapup=False))
+        except: result = (False, traceback.format_exc())
+        conn.send(result)
+    conn.close()
+
+
+if __name__ == '__main__': # Worker process, started by a Pool
+    import matplotlib
+    matplotlib.use('Agg') # Figures are only saved to files
+    host, port = os.environ[addressenv].rsplit(':', 1)
+    work((host, int(port)), os.environ[authkeyenv].decode('hex'))
+    from neuron import h
+    h.quit()
@@ -16,6 +16,7 @@ import pickle
 import multiprocessing
 import Queue
 import subprocess
+import evalpool
 
 ngen = -1 #global variable keeping number of generations
 
@@ -35,6 +36,9 @@ num_elites = pop_size/10 # num of top individuals kept each generation - maybe s
 max_generations = 2000
 max_evaluations = max_generations *  num_islands * pop_size
 targets_eval = [0] # center-out reaching target to evaluate
+evaluation = 'pbs' # how to evaluate each generation: 'pbs' (sbatch job running main.py per candidate) or 'pool' (persistent local simulation workers, see evalpool.py)
+numworkers = 4 # number of pool workers per island
+pool = None # pool of each island, started by its first generation
 
 # parameter names and ranges
 pNames = []
@@ -242,6 +246,7 @@ cd '/home/salvadord/m1ms/sim/'
         text_file.write("\nwait \n")
 
     #subprocess.call
+    evalstart = time()
     output, pinput = popen2('sbatch '+batchfile) # Open a pipe to the qsub command.
     pinput.close()
 
@@ -275,6 +280,8 @@ cd '/home/salvadord/m1ms/sim/'
                 targetFitness[icand][itarget] = default_error
                 jobs_completed+=1
         sleep(2) # sleep 2 seconds before checking agains
+    evaltime = time()-evalstart
+    print '%d evaluations in %.1f s: %.1f evaluations per hour' % (total_jobs, evaltime, total_jobs/evaltime*3600) # throughput, to compare with parallel_evaluation_pool
     print targetFitness
     try:
         fitness = [mean(x) for x in targetFitness]
@@ -284,6 +291,36 @@ cd '/home/salvadord/m1ms/sim/'
     return fitness
 
 
+###############################################################################
+### Pool evaluation
+###############################################################################   
+def parallel_evaluation_pool(candidates, args):
+    global ngen, targets_eval, pool
+    simdatadir = args.get('simdatadir') # load params
+    ngen += 1 # increase number of generations
+    default_error=args.get('default_error',0.3)
+    if pool is None: pool = evalpool.Pool(numworkers) # workers stay running for all generations of this island
+
+    jobs = []
+    for i, c in enumerate(candidates):
+        outfilestem=simdatadir+"/gen_"+str(ngen)+"_cand_"+str(i) # set filename
+        with open('%s_params'% (outfilestem), 'w') as f: # save current candidate params to file 
+            pickle.dump(c, f)
+        for itarget in targets_eval:
+            params = dict(zip(pNames, c)) # same variables as the command line of main.py in parallel_evaluation_pbs
+            params.update({'outfilestem':outfilestem, 'targetid':itarget})
+            jobs.append(params)
+
+    results = pool.evaluate(jobs) # error dict of each job, or None if it failed
+    targetFitness = [[default_error if result is None else result['errorFitness'] for result in results[i*len(targets_eval):(i+1)*len(targets_eval)]] for i in range(len(candidates))]
+    print targetFitness
+    fitness = [mean(x) for x in targetFitness]
+    print 'fitness:',fitness
+    return fitness
+
+evaluators = {'pbs':parallel_evaluation_pbs, 'pool':parallel_evaluation_pool}
+
+
 ###############################################################################
 ### Multiprocessing Migration
 ###############################################################################    
@@ -399,7 +436,7 @@ def create_island(rand_seed, island_number, mp_migrator, simdatadir, max_evaluat
         ea.terminator = inspyred.ec.terminators.generation_termination
         ea.observer = [inspyred.ec.observers.stats_observer, inspyred.ec.observers.file_observer]
         final_pop = ea.evolve(generator=generate_rastrigin, 
-                              evaluator=parallel_evaluation_pbs,
+                              evaluator=evaluators[evaluation],
                               pop_size=pop_size, 
                               bounder=bound_params,
                               maximize=False,
@@ -426,7 +463,7 @@ def create_island(rand_seed, island_number, mp_migrator, simdatadir, max_evaluat
         ea.terminator = inspyred.ec.terminators.evaluation_termination
         ea.observer = [inspyred.ec.observers.stats_observer, inspyred.ec.observers.file_observer]
         final_pop = ea.evolve(generator=generate_rastrigin,
-                            evaluator=parallel_evaluation_pbs,
+                            evaluator=evaluators[evaluation],
                             pop_size=pop_size,
                             bounder=bound_params,
                             maximize=False,
@@ -445,7 +482,7 @@ def create_island(rand_seed, island_number, mp_migrator, simdatadir, max_evaluat
         ea.terminator = inspyred.ec.terminators.generation_termination
         ea.observer = [inspyred.ec.observers.stats_observer, inspyred.ec.observers.file_observer]
         final_pop = ea.evolve(generator=generate_rastrigin, 
-                            evaluator=parallel_evaluation_pbs,
+                            evaluator=evaluators[evaluation],
                             pop_size=pop_size,
                             bounder=bound_params,
                             maximize=False,
@@ -469,7 +506,7 @@ def create_island(rand_seed, island_number, mp_migrator, simdatadir, max_evaluat
         ea.terminator = inspyred.ec.terminators.generation_termination
         ea.observer = [inspyred.ec.observers.stats_observer, inspyred.ec.observers.file_observer]
         final_pop = ea.evolve(generator=generate_rastrigin, 
-                            evaluator=parallel_evaluation_pbs,
+                            evaluator=evaluators[evaluation],
                             pop_size=pop_size,
                             bounder=bound_params,
                             maximize=False,
@@ -494,7 +531,7 @@ def create_island(rand_seed, island_number, mp_migrator, simdatadir, max_evaluat
         ea.terminator = inspyred.ec.terminators.generation_termination
         ea.observer = [inspyred.ec.observers.stats_observer, inspyred.ec.observers.file_observer]
         final_pop = ea.evolve(generator=generate_rastrigin,
-                            evaluator=parallel_evaluation_pbs,
+                            evaluator=evaluators[evaluation],
                             pop_size=pop_size,
                             bounder=bound_params,
                             maximize=False,
@@ -513,7 +550,7 @@ def create_island(rand_seed, island_number, mp_migrator, simdatadir, max_evaluat
         ea.terminator = inspyred.ec.terminators.generation_termination
         ea.observer = [inspyred.ec.observers.stats_observer, inspyred.ec.observers.file_observer]
         final_pop = ea.evolve(generator=generate_rastrigin,
-                            evaluator=parallel_evaluation_pbs,
+                            evaluator=evaluators[evaluation],
                             pop_size=pop_size,
                             bounder=bound_params,
                             maximize=False,
@@ -533,7 +570,7 @@ def create_island(rand_seed, island_number, mp_migrator, simdatadir, max_evaluat
         ea.terminator = inspyred.ec.terminators.generation_termination
         ea.observer = [inspyred.ec.observers.stats_observer, inspyred.ec.observers.file_observer]
         final_pop = ea.evolve(generator=generate_rastrigin,
-                            evaluator=parallel_evaluation_pbs,
+                            evaluator=evaluators[evaluation],
                             pop_size=pop_size,
                             bounder=bound_params,
                             maximize=False,
@@ -555,7 +592,7 @@ def create_island(rand_seed, island_number, mp_migrator, simdatadir, max_evaluat
         ea.observer = [inspyred.ec.observers.stats_observer, inspyred.ec.observers.file_observer]
         ea.topology = inspyred.swarm.topologies.ring_topology
         final_pop = ea.evolve(generator=generate_rastrigin,
-                            evaluator=parallel_evaluation_pbs,
+                            evaluator=evaluators[evaluation],
                             pop_size=pop_size,
                             num_offspring=pop_size,
                             num_selected=pop_size/2,
@@ -577,7 +614,7 @@ def create_island(rand_seed, island_number, mp_migrator, simdatadir, max_evaluat
         ea.observer = [inspyred.ec.observers.stats_observer, inspyred.ec.observers.file_observer]
         ea.topology = inspyred.swarm.topologies.ring_topology
         final_pop = ea.evolve(generator=generate_rastrigin,
-                            evaluator=parallel_evaluation_pbs,
+                            evaluator=evaluators[evaluation],
                             pop_size=pop_size,
                             bounder=bound_params,
                             maximize=False,
@@ -0,0 +1,62 @@
+"""
+EXCHANGE
+
+Spike exchange settings of runSim. With MPI, the hosts exchange the spikes of
+their cells at a fixed interval: the minimum delay of the NetCons from cells
+on other hosts, or s.maxstep if shorter. These include the NetCons that send
+presynaptic spikes to the STDP mechanisms, with a delay of s.stdpdelay (by
+default 1 ms, which halves the interval of the connections' minimum delay of 2
+ms or more). configure() computes the minimum delay of the connections
+(s.conndata) across hosts and the resulting interval, and sets the options of
+NEURON's spike exchange:
+- s.spikecompress: with n > 0, pc.spike_compress(n, True): spike times are
+  sent as one byte (steps within the interval) and, with less than 256 cells
+  per host, gids as one byte, in a fixed-size allgather of up to n spikes per
+  host -- hosts with more spikes send the rest in a second exchange.
+- s.multisend: spikes are sent only to the hosts with targets of them, instead
+  of an allgather to all hosts. This needs a NEURON built with multisend; the
+  standard builds (e.g. the pip wheels) abort.
+- s.binqueue: cvode.queue_mode -- events are kept in bins of one time step
+  instead of a priority queue. Events within a step are then no longer
+  delivered in time order, which changes the spikes slightly for Izhi2007
+  point processes but breaks the half-step self-events of the Izhi2007a cells,
+  so it needs s.artificialcells = False. (The self-event queue of queue_mode
+  fails with either cell.)
+report() prints the spike exchange time per exchange (pc.wait_time(), which
+includes waiting for slower hosts) as min/mean/max across hosts, so the
+options can be compared for each number of hosts (see also benchmark.py
+exchange).
+
+Usage example:
+    mpiexec -n 8 nrniv -mpi -python main.py spikecompress=20 binqueue=True
+
+Version: 2026oct18
+"""
+
+from pylab import inf
+from neuron import h
+import shared as s
+
+
+## Set the exchange interval and the spike exchange options; returns the interval (ms)
+def configure():
+    conndelays = s.conndata[3] if hasattr(s, 'conndata') else []
+    s.connmindelay = s.pc.allreduce(float(conndelays.min()) if len(conndelays) else inf, 3) # Minimum delay of the connections of all hosts
+    s.exchangeinterval = s.pc.allreduce(s.pc.set_maxstep(s.maxstep), 3) # set_maxstep returns the minimum delay of the NetCons to this host from other hosts, or maxstep
+    if s.spikecompress or s.multisend: s.spikecompressed = int(s.pc.spike_compress(s.spikecompress, s.spikecompress > 0, int(s.multisend))) # Spikes per host sent compressed; 0 if not possible (e.g. serial runs)
+    else: s.spikecompressed = int(s.pc.spike_compress(0, False)) # Off -- also after a previous run with compression
+    if s.binqueue and s.artificialcells: raise Exception('binqueue needs Izhi2007 point processes (artificialcells=False), since it breaks the time steps of Izhi2007a cells')
+    h.CVode().queue_mode(int(s.binqueue), 0)
+    if s.rank==0 and s.nhosts > 1:
+        options = [name for name,used in [('compression of %i spikes' % s.spikecompressed, s.spikecompressed), ('multisend', s.multisend), ('bin queue', s.binqueue)] if used]
+        print('  Spike exchange every %0.2f ms (%smaxstep %0.2f ms); %s' % (s.exchangeinterval, 'minimum connection delay %0.2f ms; ' % s.connmindelay if s.connmindelay < inf else '', s.maxstep, ', '.join(options) or 'default options'))
+    return s.exchangeinterval
+
+
+## Print the spike exchange time per exchange, from the wait time of this host (s) over duration (ms); returns min, mean and max across hosts (s)
+def report(waittime, duration):
+    nexchanges = max(int(round(duration/s.exchangeinterval)), 1)
+    pertime = waittime/nexchanges
+    minper, meanper, maxper = s.pc.allreduce(pertime, 3), s.pc.allreduce(pertime, 1)/s.nhosts, s.pc.allreduce(pertime, 2)
+    if s.rank==0 and s.nhosts > 1: print('  Spike exchange time per exchange (%i exchanges): min = %0.1f us, mean = %0.1f us, max = %0.1f us' % (nexchanges, minper*1e6, meanper*1e6, maxper*1e6))
+    return minper, meanper, maxper
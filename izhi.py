@@ -23,20 +23,27 @@ Cell types available are based on Izhikevich, 2007 book:
     7. RTN - Rat reticular thalamic nucleus (RTN) cell  (fig8.32 from 2007 book)
 
 
+Each function creates an Izhi2007 point process in the given section, or,
+without a section, an Izhi2007a artificial cell (see izhi2007a.mod), which
+needs none.
+
 Usage example:
     from neuron import h
     from izhi import pyramidal
     dummy = h.Section()
-    cell = pyramidal(dummy)
+    cell = pyramidal(dummy) # Izhi2007 point process
+    cell = pyramidal() # Izhi2007a artificial cell
 
 Version: 2013oct16 by cliffk
 Version: 2015mar30 by Salvador Dura-Bernal (salvadordura@gmail.com)
+Version: 2026oct18
 """
 
 ## Create basic Izhikevich neuron with default parameters -- not to be called directly, only via one of the other functions
 def createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid):
     from neuron import h # Open NEURON
-    cell = h.Izhi2007(0,sec=section) # Create a new Izhikevich neuron at location 0 (doesn't matter where) in h.Section() "section"
+    if section is None: cell = h.Izhi2007a() # Create a new Izhikevich artificial cell, which needs no section
+    else: cell = h.Izhi2007(0,sec=section) # Create a new Izhikevich neuron at location 0 (doesn't matter where) in h.Section() "section"
     cell.C = C # Capacitance
     cell.k = k
     cell.vr = vr # Resting membrane potential
@@ -53,37 +60,37 @@ def createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid):
 
 ## Cell types based on Izhikevich, 2007 book
 ## Layer 5 regular spiking (RS) pyramidal cell (fig 8.12 from 2007 book)
-def RS(section, C=1, k=0.7, vr=-60, vt=-40, vpeak=35, a=0.03, b=-2, c=-50, d=100, celltype=1, cellid=-1):
+def RS(section=None, C=1, k=0.7, vr=-60, vt=-40, vpeak=35, a=0.03, b=-2, c=-50, d=100, celltype=1, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## Layer 5 intrinsically bursting (IB) cell (fig 8.19 from 2007 book)
-def IB(section, C=1.50, k=1.2, vr=-75, vt=-45, vpeak=50, a=0.01, b=5, c=-56, d=130, celltype=2, cellid=-1):
+def IB(section=None, C=1.50, k=1.2, vr=-75, vt=-45, vpeak=50, a=0.01, b=5, c=-56, d=130, celltype=2, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## Cat primary visual cortex chattering (CH) cell (fig8.23 from 2007 book)
-def CH(section, C=0.50, k=1.5, vr=-60, vt=-40, vpeak=25, a=0.03, b=1, c=-40, d=150, celltype=3, cellid=-1):
+def CH(section=None, C=0.50, k=1.5, vr=-60, vt=-40, vpeak=25, a=0.03, b=1, c=-40, d=150, celltype=3, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## Rat barrel cortex Low-threshold  spiking (LTS) interneuron (fig8.25 from 2007 book)
-def LTS(section, C=1.00, k=1, vr=-56, vt=-42, vpeak=40, a=0.03, b=8, c=-53, d=20, celltype=4, cellid=-1):
+def LTS(section=None, C=1.00, k=1, vr=-56, vt=-42, vpeak=40, a=0.03, b=8, c=-53, d=20, celltype=4, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## layer 5 rat visual cortex fast-spiking (FS) interneuron (fig8.27 from 2007 book)
-def FS(section, C=0.20, k=1, vr=-55, vt=-40, vpeak=25, a=0.2, b=-2, c=-45, d=-55, celltype=5, cellid=-1):
+def FS(section=None, C=0.20, k=1, vr=-55, vt=-40, vpeak=25, a=0.2, b=-2, c=-45, d=-55, celltype=5, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## Cat dorsal LGN thalamocortical (TC) cell (fig8.31 from 2007 book)
-def TC(section, C=2.00, k=1.6, vr=-60, vt=-50, vpeak=35, a=0.01, b=15, c=-60, d=10, celltype=6, cellid=-1):
+def TC(section=None, C=2.00, k=1.6, vr=-60, vt=-50, vpeak=35, a=0.01, b=15, c=-60, d=10, celltype=6, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## Rat reticular thalamic nucleus (RTN) cell  (fig8.32 from 2007 book)
-def RTN(section, C=0.40, k=0.25, vr=-65, vt=-45, vpeak=0, a=0.015, b=10, c=-55, d=50, celltype=7, cellid=-1):
+def RTN(section=None, C=0.40, k=0.25, vr=-65, vt=-45, vpeak=0, a=0.015, b=10, c=-55, d=50, celltype=7, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
@@ -91,26 +98,26 @@ def RTN(section, C=0.40, k=0.25, vr=-65, vt=-45, vpeak=0, a=0.015, b=10, c=-55,
 
 ## Cell types based on Izhikevich, 2008 paper (wrong parameters cause cells in that paper where multicompartment)
 ## Excitatory layer 2/3 pyramidal cell
-def pyramidal(section, C=1.00, k=3, vr=-60, vt=-50, vpeak=30, a=0.01, b=5, c=-60, d=400, celltype=1, cellid=-1):
+def pyramidal(section=None, C=1.00, k=3, vr=-60, vt=-50, vpeak=30, a=0.01, b=5, c=-60, d=400, celltype=1, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## Inhibitory fast-spiking basket interneuron
-def fastspiking(section, C=0.20, k=1, vr=-55, vt=-40, vpeak=25, a=0.15, b=8, c=-55, d=200, celltype=2, cellid=-1):
+def fastspiking(section=None, C=0.20, k=1, vr=-55, vt=-40, vpeak=25, a=0.15, b=8, c=-55, d=200, celltype=2, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## Inhibitory low-threshold-spiking interneuron
-def lowthreshold(section, C=1.00, k=3, vr=-56, vt=-42, vpeak=40, a=0.03, b=8, c=-50, d=20, celltype=3, cellid=-1):
+def lowthreshold(section=None, C=1.00, k=3, vr=-56, vt=-42, vpeak=40, a=0.03, b=8, c=-50, d=20, celltype=3, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## Thalamocortical relay cell
-def thalamocortical(section, C=2.00, k=0.5, vr=-60, vt=-50, vpeak=40, a=0.1, b=15, c=-60, d=10, celltype=4, cellid=-1):
+def thalamocortical(section=None, C=2.00, k=0.5, vr=-60, vt=-50, vpeak=40, a=0.1, b=15, c=-60, d=10, celltype=4, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
 
 ## Thalamic reticular nucleus cell
-def reticular(section, C=0.40, k=0.25, vr=-65, vt=-45, vpeak=0, a=0.015, b=10, c=-55, d=50, celltype=5, cellid=-1):
+def reticular(section=None, C=0.40, k=0.25, vr=-65, vt=-45, vpeak=0, a=0.015, b=10, c=-55, d=50, celltype=5, cellid=-1):
     cell = createcell(section, C, k, vr, vt, vpeak, a, b, c, d, celltype, cellid)
     return cell
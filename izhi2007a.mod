@@ -0,0 +1,121 @@
+COMMENT
+ARTIFICIAL_CELL version of Izhi2007 (see izhi2007.mod): the same "simple"
+implementation of the Izhikevich neuron with AMPA, NMDA, GABA_A, and GABA_B
+receptor dynamics, but needing no section. Instead of a BREAKPOINT, each cell
+steps itself with a self-event every dt, and instead of a WATCH statement it
+checks the threshold after each step, spiking when the threshold condition
+becomes true (as WATCH does). The self-event that integrates up to the end of
+a time step comes half a step earlier, after the inputs that the fixed step
+method delivers before integrating that step, and the spike and reset come at
+the end of the step, as the WATCH event of Izhi2007 does, so with the fixed
+step method both give the same spikes -- except, rarely, when an input arrives
+exactly half a step before the end of a step, at the same time as the
+self-event.
+
+Equations and parameter values are taken from
+  Izhikevich EM (2007).
+  "Dynamical systems in neuroscience"
+  MIT Press
+
+Equation for synaptic inputs taken from
+  Izhikevich EM, Edelman GM (2008).
+  "Large-scale model of mammalian thalamocortical systems."
+  PNAS 105(9) 3593-3598.
+
+Example usage (in Python):
+  from neuron import h
+  izhl = [h.Izhi2007a() for i in range(2)] # Create two new Izhikevich cells -- no section needed
+  connection = h.NetCon(izhl[0], izhl[1]) # Connect them
+  izhl[0].Iin = 70  # activate 1 cell
+
+Cell types available are based on Izhikevich, 2007 book:
+    1. RS - Layer 5 regular spiking pyramidal cell (fig 8.12 from 2007 book)
+    2. IB - Layer 5 intrinsically bursting cell (fig 8.19 from 2007 book)
+    3. CH - Cat primary visual cortex chattering cell (fig8.23 from 2007 book)
+    4. LTS - Rat barrel cortex Low-threshold  spiking interneuron (fig 8.25 from 2007 book)
+    5. FS - Rat visual cortex layer 5 fast-spiking interneuron (fig 8.27 from 2007 book)
+    6. TC - Cat dorsal LGN thalamocortical (TC) cell (fig 8.31 from 2007 book)
+    7. RTN - Rat reticular thalamic nucleus (RTN) cell  (fig 8.32 from 2007 book)
+ENDCOMMENT
+
+: Declare name of object and variables
+NEURON {
+  ARTIFICIAL_CELL Izhi2007a
+  THREADSAFE : No GLOBALs -- every variable, including the trace buffer, belongs to its instance (declared before the POINTER, or nocmodl ignores it)
+  RANGE C, k, vr, vt, vpeak, a, b, c, d, Iin, tauAMPA, tauNMDA, tauGABAA, tauGABAB, tauOpsin, celltype, alive, cellid, verbose
+  POINTER tracebuf
+  RANGE V, u, gAMPA, gNMDA, gGABAA, gGABAB, gOpsin, I
+  RANGE factor, eventflag, delta, t0, method, above
+}
+
+INCLUDE "izhi2007.inc" : Declarations, integration, reset and trace shared with Izhi2007
+
+ASSIGNED {
+  above : Whether the threshold condition held after the previous step (a spike needs it to become true, as with WATCH)
+  dt (ms)
+}
+
+: Initial conditions
+INITIAL {
+  initstate()
+  above = crossed()
+  net_send(dt/2,1) : First step, integrated half a step before its end (see integrate())
+}
+
+: Whether the voltage is above the threshold -- the condition of the WATCH statements of Izhi2007
+FUNCTION crossed() {
+  if (celltype == 4) { : LTS cell
+    crossed = (V>(vpeak-0.1*u))
+  }
+  else if (celltype == 6) { : TC cell
+    crossed = (V>(vpeak+0.1*u))
+  }
+  else { : default
+    crossed = (V>vpeak)
+  }
+}
+
+: Define neuron dynamics -- the BREAKPOINT of Izhi2007, run by the self-event half a step before the end of each step, so up to t+dt/2
+PROCEDURE integrate() {
+  delta = t+dt/2-t0 : Find time difference
+  advance()
+  t0=t+dt/2 : Reset last time so delta can be calculated in the next time step
+  tracestep()
+}
+
+: Input received
+NET_RECEIVE (wAMPA, wNMDA, wGABAA, wGABAB, wOpsin) {
+  INITIAL { wAMPA=wAMPA wNMDA=wNMDA wGABAA=wGABAA wGABAB=wGABAB wOpsin=wOpsin} : Insanely stupid but required, otherwise reset to 0,
+
+  : Time step -- self-event
+  if (flag == 1) {
+    integrate()
+    if (crossed()) { : Check if threshold has been crossed, and if so, spike at the end of the step with flag=2
+      if (!above) {net_send(dt/2,2)}
+      above = 1
+    }
+    else {above = 0}
+    net_send(dt,1) : Next step
+  }
+
+  : Threshold crossed
+  else if (flag == 2) {
+    if (alive) {net_event(t)} : Send spike event if the cell is alive
+    reset()
+  }
+
+  : Actual input, calculate receptor dynamics
+  else {
+    gAMPA = gAMPA + wAMPA
+    gNMDA = gNMDA + wNMDA
+    gGABAA = gGABAA + wGABAA
+    gGABAB = gGABAB + wGABAB
+    gOpsin = gOpsin + wOpsin
+  }
+
+  : Trace the event -- except time steps, which are traced by integrate()
+  if (flag != 1) {
+    eventflag = flag
+    traceevent()
+  }
+}
@@ -25,15 +25,30 @@ Version: 2014feb21 by cliffk
 ### IMPORT MODULES
 ###############################################################################
 
-from pylab import seed, rand, sqrt, exp, transpose, ceil, concatenate, array, zeros, ones, vstack, show, disp, mean, inf, concatenate, unique, delete
+from pylab import seed, rand, sqrt, exp, transpose, ceil, concatenate, array, zeros, ones, vstack, show, disp, mean, inf, concatenate, unique, delete, diff, hstack, repeat, argsort, nonzero, linspace, bincount
+from heapq import heappush, heappop
 from time import time, sleep
+from resource import getrusage, RUSAGE_SELF
 from datetime import datetime
 from scipy.io import savemat, loadmat 
 import pickle
+import os
+import sys
+import traceback
 
 from neuron import h, init, run # Import NEURON
 import shared as s # Import all shared variables and parameters
 import analysis
+import connectivity
+import conncache
+import shards
+import spikestream
+import tracing
+import exchange
+import profiler
+import benchmark
+import snapshot
+import checkpoint
 from arm import Arm # Class with arm methods and variables
 
 
@@ -74,8 +89,10 @@ def runTrainTest2targets():
     s.savemat = 0 # save data during testing
     s.armMinimalSave = 1 # save only arm related data
 
-    # initialize network
-    createNetwork() 
+    # initialize network -- or restore the trained network from a snapshot and skip training
+    restored = s.snapshotfile and snapshot.exists(s.snapshotfile)
+    if restored: snapshot.restore(s.snapshotfile)
+    else: createNetwork() 
     addStimulation()
     addBackground()
 
@@ -86,11 +103,13 @@ def runTrainTest2targets():
     s.antagInh = 0 # enable exploratory movements
     s.duration = s.trainTime # train time
 
-    setupSim()
-    runSim()
-    finalizeSim()
-    #saveData()
-    plotData()
+    if not restored:
+        setupSim()
+        runSim()
+        finalizeSim()
+        #saveData()
+        plotData()
+        if s.snapshotfile: snapshot.save(s.snapshotfile)
 
     # test target 0
     s.backgroundrate=s.backgroundrateTest # 300
@@ -102,30 +121,19 @@ def runTrainTest2targets():
     s.duration = s.testTime # testing time
     s.armMinimalSave = 0 # save only arm related data
     
-    s.targetid = 0
-    setupSim()
-    runSim()
-    finalizeSim()
-    #saveData()
-    plotData()
+    def testTarget(): # After testing each target: plot it and return its error
+        saveData()
+        plotData()
+        if s.rank == 0:
+            error = mean(s.arm.errorAll)
+            print 'Target error for target ',s.targetid,' is:', error 
+            s.arm.plotTraj(s.outfilestem+'_t%d.png' % s.targetid) 
+            return error
 
-    if s.rank == 0: # save error to file
-        error0 = mean(s.arm.errorAll)
-        print 'Target error for target ',s.targetid,' is:', error0 
-        s.arm.plotTraj(s.outfilestem+'_t0.png') 
-
-    # test target 1
-    s.targetid = 1
-    setupSim()
-    runSim()
-    finalizeSim()
-    saveData()
-    plotData()
+    error0, error1 = testTargets([0, 1], testTarget)
 
     if s.rank == 0: # save error to file
-        error1 = mean(s.arm.errorAll)
         print 'Target error for target 0=', error0, '; target 1=', error1 
-        s.arm.plotTraj(s.outfilestem+'_t1.png') 
 
         errorMean = (error0+error1)/2
         errorFitness = errorMean + abs(error0-error1)  # fitness penalizes difference between target errors
@@ -150,7 +158,7 @@ def runTrainTest2targets():
 
 
 # training and testing to 2 targets via evolutionary optim algorithm (batch, no graphics)
-def runTrainTest2targetsOptim():
+def runTrainTest2targetsOptim(wrapup=True): # wrapup: whether to close MPI and quit at the end -- not in processes that evaluate many candidates (see evalpool.py), which get the error dict returned instead
     # evol optimizes the following:
     s.RLrates = s.RLfactor*array([[0.25, -0.25], [0.0, 0.0]]) # RL potentiation/depression rates for E->anything and I->anything, e.g. [0,:] is pot/dep for E cells
     s.connprobs[s.PMd,s.ER5]=s.PMdconnprob
@@ -182,20 +190,24 @@ def runTrainTest2targetsOptim():
     s.duration = s.trainTime # train time
     s.timebetweensaves =  s.trainTime - 1000
 
-    # initialize network
-    createNetwork() 
+    # initialize network -- or restore the trained network from a snapshot and skip training
+    restored = s.snapshotfile and snapshot.exists(s.snapshotfile)
+    if restored: snapshot.restore(s.snapshotfile)
+    else: createNetwork() 
     addStimulation()
     addBackground()
 
     # run train
-    setupSim()
-    runSim()
-    finalizeSim()
-    #saveData()
-    #plotData()
-    if s.rank == 0: # save png of traj
-        s.arm.plotTraj(s.outfilestem+'_train.png')  # save traj fig to file 
-        analysis.plotweightchanges(s.outfilestem+'_train_weights.png')
+    if not restored:
+        setupSim()
+        runSim()
+        finalizeSim()
+        #saveData()
+        #plotData()
+        if s.rank == 0: # save png of traj
+            s.arm.plotTraj(s.outfilestem+'_train.png')  # save traj fig to file 
+            analysis.plotweightchanges(s.outfilestem+'_train_weights.png')
+        if s.snapshotfile: snapshot.save(s.snapshotfile)
 
     test = 1
     s.savemat = 1
@@ -210,32 +222,20 @@ def runTrainTest2targetsOptim():
         s.duration = s.testTime # testing time
         s.armMinimalSave = 0 # save only arm related data
         
-        s.targetid = 0
-        setupSim()
-        runSim()
-        finalizeSim()
-        saveData()
-        #plotData()
-
-        if s.rank == 0: # save error to file
-            error0 = mean(s.arm.errorAll)
-            print 'Target error for target ',s.targetid,' is:', error0 
-            s.arm.plotTraj(s.outfilestem+'_t0.png') 
-            analysis.plotraster(s.outfilestem+'_t0_raster.png')
+        def testTarget(): # After testing each target: save it and return its error
+            saveData()
+            #plotData()
+            if s.rank == 0:
+                error = mean(s.arm.errorAll)
+                print 'Target error for target ',s.targetid,' is:', error 
+                s.arm.plotTraj(s.outfilestem+'_t%d.png' % s.targetid) 
+                analysis.plotraster(s.outfilestem+'_t%d_raster.png' % s.targetid)
+                return error
 
-        # test target 1
-        s.targetid = 1
-        setupSim()
-        runSim()
-        finalizeSim()
-        saveData()
-        #plotData()
+        error0, error1 = testTargets([0, 1], testTarget)
 
         if s.rank == 0: # save error to file
-            error1 = mean(s.arm.errorAll)
             print 'Target error for target 0=', error0, '; target 1=', error1 
-            s.arm.plotTraj(s.outfilestem+'_t1.png') 
-            analysis.plotraster(s.outfilestem+'_t1_raster.png')
 
             errorMean = (error0+error1)/2
             errorFitness = errorMean + abs(error0-error1)  # fitness penalizes difference between target errors
@@ -251,6 +251,8 @@ def runTrainTest2targetsOptim():
             with open('%s_target_%d_error'% (s.outfilestem,s.targetid), 'w') as f: # save avg error over targets to outfilestem
                 pickle.dump(errorDic, f)
 
+    if not wrapup: return errorDic if s.rank == 0 and test else None
+
     ## Wrapping up
     s.pc.runworker() # MPI: Start simulations running on each host
     s.pc.done() # MPI: Close MPI
@@ -259,18 +261,89 @@ def runTrainTest2targetsOptim():
     if (s.plotraster==False and s.plotconn==False and s.plotweightchanges==False): h.quit() # Quit extra processes, or everything if plotting wasn't requested (since assume non-interactive)
 
 
+## Test the network on each target with setupSim, runSim, finalizeSim and then after(), and return what after() returns on host 0 for each target -- one target after another, or with s.paralleltest all at once, each in a forked copy of this process (a copy of the trained network, which tests its target with its own arm)
+def testTargets(targets, after):
+    if not s.paralleltest or s.nhosts > 1 or s.nthreads > 1: # Forked processes can't use MPI, nor the threads of NEURON (which are not forked), so test one target at a time
+        results = []
+        for targetid in targets:
+            s.targetid = targetid
+            setupSim()
+            runSim()
+            finalizeSim()
+            results.append(after())
+        return results
+
+    teststart = time()
+    children = [] # Process ID and pipe of each target
+    for t,targetid in enumerate(targets):
+        readfd, writefd = os.pipe()
+        pid = os.fork()
+        if pid == 0: # Forked process: test this target, send the result back and exit
+            os.close(readfd)
+            status = 1
+            try:
+                s.targetid = targetid
+                s.nruns += t # Same checkpoints as when testing the targets one after another
+                setupSim()
+                runSim()
+                finalizeSim()
+                with os.fdopen(writefd, 'wb') as f: pickle.dump(after(), f, pickle.HIGHEST_PROTOCOL)
+                status = 0
+            except: traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                os._exit(status) # Not sys.exit, which would run the exit handlers of this process
+        os.close(writefd)
+        children.append((pid, readfd))
+
+    results = []
+    for targetid,(pid,readfd) in zip(targets, children):
+        with os.fdopen(readfd, 'rb') as f: result = f.read()
+        status = os.waitpid(pid, 0)[1]
+        if status or not result: raise Exception('Test of target %i failed (exit status %i)' % (targetid, status))
+        results.append(pickle.loads(result))
+    s.nruns += len(targets)
+    print('Tested targets %s in parallel; time = %0.1f s' % (targets, time()-teststart))
+    return results
+
+
 ###############################################################################
 ### Create Network
 ###############################################################################
 
-def createNetwork():
+## Section for an Izhi2007 point process, kept in s.dummies; None for an Izhi2007a artificial cell, which needs none
+def dummySection():
+    if s.artificialcells: return None
+    s.dummies.append(h.Section()) # Create fake section
+    return s.dummies[-1]
+
+
+## Run the cells of this host on s.nthreads threads (pc.nthread) and record the thread of each in s.cellthreads -- NEURON deals the artificial cells out itself, and the sections of the Izhi2007 point processes are partitioned in turn
+def setupThreads():
+    s.pc.nthread(s.nthreads)
+    if s.nthreads > 1 and len(s.dummies):
+        for thread in range(s.nthreads):
+            sections = h.SectionList()
+            for dummy in s.dummies[thread::s.nthreads]: sections.append(sec=dummy)
+            s.pc.partition(thread, sections)
+    h.fcurrent() # Sets up the threads, so each mechanism knows the one it is on
+    s.cellthreads = cellThreads()
+
+
+## Thread of each cell of this host, as NEURON assigned it -- the inputs (NSLOCs and VecStims) only send events, so their threads don't matter
+def cellThreads():
+    return array([int(cell.threadid()) if hasattr(cell, 'threadid') else 0 for cell in s.cells], dtype=int)
+
+
+def createNetwork(conndata=None): # conndata: connections of this host (e.g. from a snapshot) to use instead of calculating them
     ## Print diagnostic information
-    if s.rank==0: print("\nCreating simulation of %i cells for %0.1f s on %i hosts..." % (sum(s.popnumbers),s.duration/1000.,s.nhosts)) 
+    if s.rank==0: print("\nCreating simulation of %i cells for %0.1f s on %i hosts%s..." % (sum(s.popnumbers),s.duration/1000.,s.nhosts,' x %i threads' % s.nthreads if s.nthreads > 1 else '')) 
     s.pc.barrier()
     
     ## Create empty data structures
     s.cells=[] # Create empty list for storing cells
-    s.dummies=[] # Create empty list for storing fake sections
+    s.dummies=[] # Create empty list for storing fake sections -- only for Izhi2007 point processes
+    s.pmdrands=[] # Random number generators of the PMd NSLOCs with noise
     s.gidVec=[] # Empty list for storing GIDs (index = local id; value = gid)
     s.gidDic = {} # Empyt dict for storing GIDs (key = gid; value = local id) -- ~x6 faster than gidVec.index()
     
@@ -303,8 +376,7 @@ def createNetwork():
     s.hostspikevecs = [] # Empty list for storing host-specific spike vectors
     s.cellsperhost = 0
     if s.PMdinput == 'Plexon': ninnclDic = len(s.innclDic) # number of PMd created in this worker
-    for c in xrange(int(s.rank), s.ncells, s.nhosts):
-        s.dummies.append(h.Section()) # Create fake sections
+    for c in distributeCells():
         gid = c
         if s.cellnames[gid] == 'PMd':
             if s.PMdinput == 'Plexon':
@@ -317,6 +389,12 @@ def createNetwork():
                 cell.number = s.backgroundnumber
                 cell.interval = s.backgroundrateMin**-1*1e3
                 cell.noise = s.PMdNoiseRatio
+                if s.nthreads > 1: # NSLOCs are only thread safe with their own random number generator (see nsloc.mod); serial runs keep the global one, as before
+                    pmdrand = h.Random()
+                    pmdrand.MCellRan4(gid,gid*2)
+                    pmdrand.negexp(1)
+                    s.pmdrands.append(pmdrand)
+                    cell.noiseFromRandom(pmdrand)
             elif s.PMdinput == 'spikes':
                 cell = h.VecStim()
             else:
@@ -328,10 +406,10 @@ def createNetwork():
             cell = celltypes[gid](cellid = gid) #create an NSLOC    
         else: 
             if s.cellclasses[gid]==3: 
-                cell = s.fastspiking(s.dummies[s.cellsperhost], vt=-47, cellid=gid) # Don't use LTS cell, but instead a FS cell with a low threshold
+                cell = s.fastspiking(dummySection(), vt=-47, cellid=gid) # Don't use LTS cell, but instead a FS cell with a low threshold
             else: 
-                cell = celltypes[gid](s.dummies[s.cellsperhost], cellid=gid) # Create a new cell of the appropriate type (celltypes[gid]) and store it
-            #if s.verbose>0: s.cells[-1].useverbose(s.verbose, s.filename+'los.txt') # Turn on diagnostic to file
+                cell = celltypes[gid](dummySection(), cellid=gid) # Create a new cell of the appropriate type (celltypes[gid]) and store it
+            cell.method = int(s.integration == 'exponential') # Integration method
         s.cells.append(cell) 
         s.gidVec.append(gid) # index = local id; value = global id
         s.gidDic[gid] = s.cellsperhost # key = global id; value = local id -- used to get local id because gid.index() too slow!
@@ -345,6 +423,7 @@ def createNetwork():
         s.pc.cell(gid, s.spikerecorders[s.cellsperhost])
         s.cellsperhost += 1 # contain cell numbers per host including PMd and P
     print('  Number of cells on node %i: %i ' % (s.rank,len(s.cells)))
+    setupThreads()
     s.pc.barrier()
 
 
@@ -356,45 +435,125 @@ def createNetwork():
      
 
     ## Calculate distances and probabilities
-    if s.rank==0: print('Calculating connection probabilities (est. time: %i s)...' % (s.performance*s.cellsperhost**2/3e4))
+    conncalcest = benchmark.estimate('conncalc', s.cellsperhost) # None if not calibrated
+    if s.rank==0: print('Calculating connection probabilities%s...' % ('' if conncalcest is None else ' (est. time: %0.1f s)' % conncalcest))
     conncalcstart = s.time() # See how long connecting the cells takes
     s.nconnpars = 5 # Connection parameters: pre- and post- cell ID, weight, distances, delays
-    s.conndata = [[] for i in range(s.nconnpars)] # List for storing connections
-    nPostCells = 0
-    EDSCpre = [] # to keep track of EB5->EDSC connection and replicate in EB5->IDSC
+    s.conndata = conndata
+    if s.conncache and conndata is None: # Try to load this host's connections from the cache
+        cachekey = conncache.cacheKey()
+        s.conndata = conncache.load(cachekey)
+    if s.conndata is None:
+        calculateConnections()
+        if s.conncache: conncache.save(cachekey, s.conndata)
+    s.nconnections = len(s.conndata[0]) # Find out how many connections we're going to make
+    conncalctime = time()-conncalcstart # See how long it took
+    profiler.add('conncalc', conncalctime)
+    if s.rank==0: print('  Done; time = %0.1f s' % conncalctime)
+    if s.connbuildercheck: connectivity.compareBuilders([gid for gid in s.gidVec if s.cellnames[gid] not in ['PMd','ASC']]) # Report speedup of grid vs full builder
+
+
+    # set plastic connections based on plasConnsType (from evol alg)
+    s.plastConns = plasticConns(s.plastConnsType)
+    s.plastMask = zeros((s.npops,s.npops), dtype=bool) # Boolean matrix of plastic population pairs
+    for prepop,pstpop in s.plastConns: s.plastMask[prepop,pstpop] = True
+
+
+    ## Actually make connections
+    connest = s.pc.allreduce(benchmark.estimate('connrate', s.nconnections) or 0, 2) # Slowest host
+    if s.rank==0: print('Making connections%s...' % (' (est. time: %0.1f s)' % connest if connest else ''))
+    print('  Number of connections on host %i: %i' % (s.rank, s.nconnections))
+    connstart = time() # See how long connecting the cells takes
+    connectCells()
+    s.nstdpconns = len(s.stdpconndata) # Get number of STDP connections
+    conntime = time()-connstart # See how long it took
+    profiler.add('gid_connect', conntime-s.stdptime)
+    if s.usestdp: print('  Number of STDP connections on host %i: %i' % (s.rank, s.nstdpconns))
+    print('  Done connecting on host %i; time = %0.1f s; peak memory = %0.1f MB' % (s.rank, conntime, getrusage(RUSAGE_SELF).ru_maxrss/1024.))
+
+
+## Global IDs of the cells of this host -- round-robin, or balanced by estimated cost
+def distributeCells():
+    if not s.loadbalance: return xrange(int(s.rank), s.ncells, s.nhosts)
+    s.cellcosts = estimateCellCosts()
+    hostloads = [(0, host) for host in range(s.nhosts)] # Heap of (estimated load, host)
+    cellhosts = zeros(s.ncells, dtype=int)
+    for gid in argsort(-s.cellcosts, kind='mergesort'): # Greedy bin packing: most expensive cell first to the least loaded host; stable sort, so every host gets the same result
+        load, host = heappop(hostloads)
+        cellhosts[gid] = host
+        heappush(hostloads, (load+s.cellcosts[gid], host))
+    s.hostloads = zeros(s.nhosts)
+    for load,host in hostloads: s.hostloads[host] = load
+    if s.rank==0: print('  Load balancing: estimated load per host min = %0.1f, max = %0.1f (round-robin max = %0.1f)' % (s.hostloads.min(), s.hostloads.max(), max([s.cellcosts[host::s.nhosts].sum() for host in range(s.nhosts)])))
+    return [int(gid) for gid in nonzero(cellhosts == s.rank)[0]]
+
+
+## Estimated relative cost of simulating each cell, from its type and the mean number of incoming connections and STDP mechanisms of a sample of its population
+def estimateCellCosts(nsample=5):
+    nslocCost, izhiCost, connCost, stdpCost = s.loadbalancecosts
+    plastMask = zeros((s.npops,s.npops), dtype=bool) # As in createNetwork
+    for prepop,pstpop in plasticConns(s.plastConnsType): plastMask[prepop,pstpop] = True
+    if s.connbuilder == 'grid': grids = connectivity.cellGrids()
+    popcosts = zeros(s.npops)
+    for pop in range(s.npops):
+        if s.popnumbers[pop] == 0: continue
+        if s.popnames[pop] in ['PMd', 'ASC']: # NSLOC or VecStim; no presynaptic connections
+            popcosts[pop] = nslocCost
+            continue
+        sample = unique(linspace(s.popGidStart[pop], s.popGidEnd[pop], nsample).astype(int)) # Same on every host
+        nconns = nstdp = 0
+        for gid in sample:
+            preids = connectivity.gridPreIds(gid, grids) if s.connbuilder == 'grid' else connectivity.fullPreIds(gid)
+            nconns += len(preids)
+            if s.usestdp: nstdp += plastMask[s.cellpops[preids], pop].sum()
+        popcosts[pop] = izhiCost + (connCost*nconns + stdpCost*nstdp)/float(len(sample))
+    return popcosts[s.cellpops]
+
+
+## Population pairs with plastic connections for each predefined set (plastConnsType, from evol alg)
+def plasticConns(plastConnsType):
+    if plastConnsType == 0:
+        plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC]] # only spinal cord 
+    elif plastConnsType == 1:
+        plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2]] # + L2-L5
+    elif plastConnsType == 2:
+        plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2],\
+        [s.ER5,s.ER6], [s.ER6,s.ER5], [s.ER6,s.EB5]] # + L6
+    elif plastConnsType == 3:
+        plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2],\
+         [s.ER5,s.ER6], [s.ER6,s.ER5], [s.ER6,s.EB5], \
+         [s.ER2,s.IL2], [s.ER2,s.IF2], [s.ER5,s.IL5], [s.ER5,s.IF5], [s.EB5,s.IL5], [s.EB5,s.IF5]] # + Inh
+    # same with additional plasticity between PMd->L5A
+    elif plastConnsType == 4: 
+        plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.PMd,s.ER5]] # only spinal cord + pmd
+    elif plastConnsType == 5:
+        plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.PMd,s.ER5], # spinal cord + pmd
+         [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2]] # + L2-L5
+    elif plastConnsType == 6:
+        plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.PMd,s.ER5], # spinal cord + pmd
+        [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2], # + L2-L5
+        [s.ER5,s.ER6], [s.ER6,s.ER5], [s.ER6,s.EB5]] # + L6
+    elif plastConnsType == 7:
+        plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.PMd,s.ER5], # spinal cord + pmd 
+        [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2], # + L2-L5
+        [s.ER5,s.ER6], [s.ER6,s.ER5], [s.ER6,s.EB5], # + L6
+        [s.ER2,s.IL2], [s.ER2,s.IF2], [s.ER5,s.IL5], [s.ER5,s.IF5], [s.EB5,s.IL5], [s.EB5,s.IF5]]  # + Inh
+    else: plastConns = s.plastConns # Not a predefined set, so use the list in shared.py
+    return plastConns
+
+
+## Calculate which cells connect to the postsynaptic cells on this host, and the distances, delays and weights
+def calculateConnections():
+    store = connectivity.ConnStore(s.cellsperhost*100, s.filename+'_conn%i' % s.rank if s.connmemmap else None) # Grows as needed
+    EDSCpre = {} # to keep track of EB5->EDSC connection and replicate in EB5->IDSC (key = EDSC gid)
+    if s.connbuilder == 'grid': grids = connectivity.cellGrids() # Spatial index of presynaptic cells
     for c in range(s.cellsperhost): # Loop over all postsynaptic cells on this host (has to be postsynaptic because of gid_connect)
         gid = s.gidVec[c] # Increment global identifier       
         if s.cellnames[gid] == 'PMd' or s.cellnames[gid] == 'ASC':
             # There are no presynaptic connections for PMd or ASC.
             continue
-        nPostCells += 1
-        if s.toroidal: 
-            xpath=(abs(s.xlocs-s.xlocs[gid]))**2
-            xpath2=(s.modelsize-abs(s.xlocs-s.xlocs[gid]))**2
-            xpath[xpath2<xpath]=xpath2[xpath2<xpath]
-            ypath=(abs(s.ylocs-s.ylocs[gid]))**2
-            ypath2=(s.modelsize-abs(s.ylocs-s.ylocs[gid]))**2
-            ypath[ypath2<ypath]=ypath2[ypath2<ypath]
-            zpath=(abs(s.zlocs-s.zlocs[gid]))**2
-            distances = sqrt(xpath + ypath) # Calculate all pairwise distances
-            distances3d = sqrt(xpath + ypath + zpath) # Calculate all pairwise 3d distances
-        else: 
-            distances = sqrt((s.xlocs-s.xlocs[gid])**2 + (s.ylocs-s.ylocs[gid])**2) # Calculate all pairwise distances
-            distances3d = sqrt((s.xlocs-s.xlocs[gid])**2 + (s.ylocs-s.ylocs[gid])**2 + (s.zlocs-s.zlocs[gid])**2) # Calculate all pairwise distances
-        allconnprobs = s.scaleconnprob[s.EorI,s.EorI[gid]] * s.connprobs[s.cellpops,s.cellpops[gid]] * exp(-distances/s.connfalloff[s.EorI]) # Calculate pairwise probabilities
-        allconnprobs[gid] = 0 # Prohibit self-connections using the cell's GID
-        seed(s.id32('%d'%(s.randseed+gid))) # Reset random number generator  
-        allrands = rand(s.ncells) # Create an array of random numbers for checking each connection  
-        if s.PMdinput == 'Plexon':
-            for c in xrange(s.popGidStart[s.PMd], s.popGidEnd[s.PMd] + 1):
-                allrands[c] = 1
-            if s.cellnames[gid] == 'ER5': # PMd->ER5 conn (full conn)
-                PMdId = (gid % s.server.numPMd) + s.ncells - s.server.numPMd #CHECK THIS!
-                allconnprobs[PMdId] = s.connprobs[s.PMd,s.ER5] # to make this connected to ER5
-                allrands[PMdId] = 0 # to make this connect to ER5
-                distances[PMdId] = 300 # to make delay 5 in conndata[3] 
-        makethisconnection = allconnprobs>allrands # Perform test to see whether or not this connection should be made
-        preids = array(makethisconnection.nonzero()[0],dtype='int') # Return True elements of that array for presynaptic cell IDs
+        if s.connbuilder == 'grid': preids = connectivity.gridPreIds(gid, grids) # Only test cells within the cutoff distance
+        else: preids = connectivity.fullPreIds(gid) # Test all cells in the network
         if s.PMdinput == 'targetSplit' and s.cellnames[gid] == 'ER5': # PMds 0-47 -> ER5 0-47 ; PMds 48-95 -> ER5 48-95 
             if gid < s.popGidStart[s.ER5] + s.popnumbers[s.ER5]/2:
                 prePMd = [(x - s.popGidStart[s.ER5])%(s.popnumbers[s.PMd]/2) + s.popGidStart[s.PMd] for x in range(gid, gid+1)] # input from 2 PMds  
@@ -404,107 +563,124 @@ def createNetwork():
                 #print 'prePMd=%d to ER5=%d:'%(prePMd[0],gid)
                 preids = concatenate([preids, prePMd])
         if s.cellnames[gid] == 'EDSC': # save EDSC presyn cells to replicate in IDSC, and add inputs from IDSC
-            EDSCpre.append(array(preids)) # save EDSC presyn cells before adding IDSC input
+            EDSCpre[gid] = array(preids) # save EDSC presyn cells before adding IDSC input
             invPops = [1, 0, 3, 2] # each postsyn ESDC cell will receive input from all the antagonistic muscle IDSCs
             IDSCpre = [s.motorCmdCellRange[invPops[i]] - s.popGidStart[s.EDSC] + s.popGidStart[s.IDSC] for i in range(s.nMuscles) if gid in s.motorCmdCellRange[i]][0]
             preids = concatenate([preids, IDSCpre]) # add IDSC presynaptic input to EDSC 
-        elif s.cellnames[gid] == 'IDSC': # use same presyn cells as for EDSC (antagonistic inhibition)
-            preids = array(EDSCpre.pop(0))
+        elif s.cellnames[gid] == 'IDSC': # use same presyn cells as for the matching EDSC (antagonistic inhibition)
+            EDSCgid = gid - s.popGidStart[s.IDSC] + s.popGidStart[s.EDSC]
+            if EDSCgid in EDSCpre: preids = EDSCpre.pop(EDSCgid)
+            elif s.connbuilder == 'grid': preids = connectivity.gridPreIds(EDSCgid, grids) # EDSC cell is on another host
+            else: preids = connectivity.fullPreIds(EDSCgid)
         postids = array(gid+zeros(len(preids)),dtype='int') # Post-synaptic cell IDs
-        s.conndata[0].append(preids) # Append pre-cell ID
-        s.conndata[1].append(postids) # Append post-cell ID
-        s.conndata[2].append(distances[preids]) # Distances
-        s.conndata[3].append(s.mindelay + distances3d[preids]/float(s.velocity)) # Calculate the delays
+        distances, distances3d = connectivity.cellDistances(gid, preids) # Calculate pairwise distances
+        if s.PMdinput == 'Plexon' and s.cellnames[gid] == 'ER5':
+            PMdId = (gid % s.server.numPMd) + s.ncells - s.server.numPMd
+            distances[preids==PMdId] = 300 # to make delay 5 in conndata[3] 
+        delays = s.mindelay + distances3d/float(s.velocity) # Calculate the delays
         wt1 = s.scaleconnweight[s.EorI[preids],s.EorI[postids]] # N weight scale factors -- WARNING, might be flipped
         wt2 = s.connweights[s.cellpops[preids],s.cellpops[postids],:] # NxM inter-population weights
         wt3 = s.receptorweight[:] # M receptor weights
         finalweights = transpose(wt1*transpose(wt2*wt3)) # Multiply out population weights with receptor weights to get NxM matrix
-        s.conndata[4].append(finalweights) # Initialize weights to 0, otherwise get memory leaks
-    for pp in range(s.nconnpars): s.conndata[pp] = array(concatenate([s.conndata[pp][c] for c in range(nPostCells)])) # Turn pre- and post- cell IDs lists into vectors
-    s.nconnections = len(s.conndata[0]) # Find out how many connections we're going to make
-    conncalctime = time()-conncalcstart # See how long it took
-    if s.rank==0: print('  Done; time = %0.1f s' % conncalctime)
-
-
-    # set plastic connections based on plasConnsType (from evol alg)
-    if s.plastConnsType == 0:
-        s.plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC]] # only spinal cord 
-    elif s.plastConnsType == 1:
-        s.plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2]] # + L2-L5
-    elif s.plastConnsType == 2:
-        s.plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2],\
-        [s.ER5,s.ER6], [s.ER6,s.ER5], [s.ER6,s.EB5]] # + L6
-    elif s.plastConnsType == 3:
-        s.plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2],\
-         [s.ER5,s.ER6], [s.ER6,s.ER5], [s.ER6,s.EB5], \
-         [s.ER2,s.IL2], [s.ER2,s.IF2], [s.ER5,s.IL5], [s.ER5,s.IF5], [s.EB5,s.IL5], [s.EB5,s.IF5]] # + Inh
-    # same with additional plasticity between PMd->L5A
-    elif s.plastConnsType == 4: 
-        s.plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.PMd,s.ER5]] # only spinal cord + pmd
-    elif s.plastConnsType == 5:
-        s.plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.PMd,s.ER5], # spinal cord + pmd
-         [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2]] # + L2-L5
-    elif s.plastConnsType == 6:
-        s.plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.PMd,s.ER5], # spinal cord + pmd
-        [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2], # + L2-L5
-        [s.ER5,s.ER6], [s.ER6,s.ER5], [s.ER6,s.EB5]] # + L6
-    elif s.plastConnsType == 7:
-        s.plastConns = [[s.ASC,s.ER2], [s.EB5,s.EDSC], [s.EB5,s.IDSC], [s.PMd,s.ER5], # spinal cord + pmd 
-        [s.ER2,s.ER5], [s.ER5,s.EB5], [s.ER2,s.EB5], [s.ER5,s.ER2], # + L2-L5
-        [s.ER5,s.ER6], [s.ER6,s.ER5], [s.ER6,s.EB5], # + L6
-        [s.ER2,s.IL2], [s.ER2,s.IF2], [s.ER5,s.IL5], [s.ER5,s.IF5], [s.EB5,s.IL5], [s.EB5,s.IF5]]  # + Inh
-
+        store.append(preids, postids, distances, delays, finalweights) # Store pre- and post-cell IDs, distances, delays and weights
+    s.conndata = store.columns() # Pre- and post-cell IDs, distances, delays and weights as arrays
 
 
-    ## Actually make connections
-    if s.rank==0: print('Making connections (est. time: %i s)...' % (s.performance*s.nconnections/9e2))
-    print('  Number of connections on host %i: %i' % (s.rank, s.nconnections))
-    connstart = time() # See how long connecting the cells takes
+## Instantiate the connections in s.conndata, one postsynaptic cell at a time
+def connectCells():
     s.connlist = [] # Create array for storing each of the connections
     s.stdpconndata = [] # Store data on STDP connections
     if s.usestdp: # STDP enabled?
         s.stdpmechs = [] # Initialize array for STDP mechanisms
         s.precons = [] # Initialize array for presynaptic spike counters
         s.pstcons = [] # Initialize array for postsynaptic spike counters
-    for con in range(s.nconnections): # Loop over each connection
-        pregid = s.conndata[0][con] # GID of presynaptic cell    
-        pstgid = s.conndata[1][con] # Index of postsynaptic cell
-        pstid = s.gidDic[pstgid]# Index of postynaptic cell -- convert from GID to local
-        newcon = s.pc.gid_connect(pregid, s.cells[pstid]) # Create a connection
-        newcon.delay = s.conndata[3][con] # Set delay
-        for r in range(s.nreceptors): newcon.weight[r] = s.conndata[4][con][r] # Set weight of connection
-        s.connlist.append(newcon) # Connect the two cells
-        if s.usestdp and ([s.cellpops[pregid],s.cellpops[pstgid]] in s.plastConns): # If using STDP and these pops are set to be plastic connections
-            if sum(abs(s.stdprates[s.EorI[pregid],:]))>0 or sum(abs(s.RLrates[s.EorI[pregid],:]))>0: # Don't create an STDP connection if the learning rates are zero
+        s.rlsource = h.RLSource() # Relays reward/punishment events to all STDP mechanisms on this host
+        s.rltrigger = h.NetCon(None, s.rlsource) # Used to send reward/punishment events from Python
+        s.rlcons = [] # Initialize array for reward/punishment connections
+        s.sparestdps = [] # STDP mechanisms created but not used (see threadSTDPs)
+    s.stdptime = 0 # Time spent creating STDP mechanisms
+    if s.nconnections == 0: return
+    learns = (abs(s.stdprates).sum(axis=1)>0) + (abs(s.RLrates).sum(axis=1)>0) # Don't create an STDP connection if the learning rates are zero
+    plastic = s.plastMask[s.cellpops[s.conndata[0]],s.cellpops[s.conndata[1]]] * learns[s.EorI[s.conndata[0]]] # Whether each connection is plastic
+    if not s.usestdp: plastic[:] = False
+    stdpconns = [] # Presynaptic GID, postsynaptic GID and index, connection and receptor of each STDP adjuster to create
+    bounds = concatenate([[0], (diff(s.conndata[1])!=0).nonzero()[0]+1, [s.nconnections]]) # Connections are stored grouped by postsynaptic cell
+    for first,last in zip(bounds[:-1], bounds[1:]): # Loop over each postsynaptic cell
+        pstgid = int(s.conndata[1][first]) # GID of postsynaptic cell
+        pstid = s.gidDic[pstgid] # Index of postynaptic cell -- convert from GID to local
+        cell = s.cells[pstid]
+        pregids = s.conndata[0][first:last].tolist() # GIDs of presynaptic cells
+        delays = s.conndata[3][first:last].tolist()
+        weights = s.conndata[4][first:last].tolist()
+        for pregid,delay,weight,isplastic in zip(pregids, delays, weights, plastic[first:last].tolist()):
+            newcon = s.pc.gid_connect(pregid, cell) # Create a connection
+            newcon.delay = delay # Set delay
+            for r in range(s.nreceptors): newcon.weight[r] = weight[r] # Set weight of connection
+            s.connlist.append(newcon) # Connect the two cells
+            if isplastic: # If using STDP and these pops are set to be plastic connections
                 for r in range(s.nreceptors): # Need a different STDP instances for each receptor
-                    if newcon.weight[r]>0: # Only make them for nonzero connections
-                        stdpmech = h.STDP(0,sec=s.dummies[pstid]) # Create STDP adjuster
-                        stdpmech.hebbwt = s.stdprates[s.EorI[pregid],0] # Potentiation rate
-                        stdpmech.antiwt = s.stdprates[s.EorI[pregid],1] # Depression rate
-                        stdpmech.wmax = s.maxweight # Maximum synaptic weight
-                        precon = s.pc.gid_connect(pregid,stdpmech); precon.weight[0] = 1 # Send presynaptic spikes to the STDP adjuster
-                        pstcon = s.pc.gid_connect(pstgid,stdpmech); pstcon.weight[0] = -1 # Send postsynaptic spikes to the STDP adjuster
-                        h.setpointer(s.connlist[-1]._ref_weight[r],'synweight',stdpmech) # Associate the STDP adjuster with this weight
-                        s.stdpmechs.append(stdpmech) # Save STDP adjuster
-                        s.precons.append(precon) # Save presynaptic spike source
-                        s.pstcons.append(pstcon) # Save postsynaptic spike source
-                        s.stdpconndata.append([pregid,pstgid,r]) # Store presynaptic cell ID, postsynaptic, and receptor
-                        if s.verbose: stdpmech.verbose = 1
-                        if s.useRL: # using RL
-                            stdpmech.RLon = 1 # make sure RL is on
-                            stdpmech.RLhebbwt = s.RLrates[s.EorI[pregid],0] # Potentiation rate
-                            stdpmech.RLantiwt = s.RLrates[s.EorI[pregid],1] # Depression rate
-                            stdpmech.tauhebb = stdpmech.tauanti = s.stdpwin # stdp time constant(ms)
-                            stdpmech.RLwindhebb = stdpmech.RLwindhebb = s.eligwin # RL eligibility trace window length (ms)
-                            stdpmech.useRLexp = s.useRLexp # RL 
-                            stdpmech.softthresh = s.useRLsoft # RL soft-thresholding
-                        else:
-                            stdpmech.RLon = 0 # make sure RL is off
-                 
-    s.nstdpconns = len(s.stdpconndata) # Get number of STDP connections
-    conntime = time()-connstart # See how long it took
-    if s.usestdp: print('  Number of STDP connections on host %i: %i' % (s.rank, s.nstdpconns))
-    if s.rank==0: print('  Done; time = %0.1f s' % conntime)
+                    if weight[r]>0: stdpconns.append((pregid, pstgid, pstid, newcon, r)) # Only make them for nonzero connections
+    stdpstart = time()
+    stdpmechs = threadSTDPs([s.cellthreads[pstid] for pregid,pstgid,pstid,newcon,r in stdpconns]) # On the thread of the postsynaptic cell -- it sets the weight the cell reads, so on another thread the two would race
+    for stdpmech,stdpconn in zip(stdpmechs, stdpconns): addSTDP(stdpmech, *stdpconn)
+    s.stdptime += time()-stdpstart
+    profiler.add('stdp', s.stdptime)
+
+
+## STDP adjusters on the given threads, one per entry. NEURON assigns artificial cells to threads itself (in turn, over all instances alive), so create them, read the thread each one is on and create more until every thread has enough; the others are kept in s.sparestdps, since deleting them would reassign the rest
+def threadSTDPs(threads):
+    if s.nthreads == 1: return [h.STDP() for thread in threads]
+    needed = bincount(threads, minlength=s.nthreads)
+    created = [h.STDP() for thread in threads]
+    while True:
+        h.fcurrent() # Assigns the new adjusters to threads
+        pools = [[] for thread in range(s.nthreads)] # Adjusters on each thread
+        for stdpmech in created: pools[int(stdpmech.threadid())].append(stdpmech)
+        shortage = max(needed - array([len(pool) for pool in pools]))
+        if shortage <= 0: break
+        created += [h.STDP() for i in range(shortage*s.nthreads)]
+    used = zeros(s.nthreads, dtype=int) # Adjusters taken from each pool
+    stdpmechs = []
+    for thread in threads:
+        stdpmechs.append(pools[thread][used[thread]])
+        used[thread] += 1
+    s.sparestdps = [stdpmech for thread,pool in enumerate(pools) for stdpmech in pool[used[thread]:]]
+    return stdpmechs
+
+
+## Check that every STDP adjuster is still on the thread of its postsynaptic cell (see threadSTDPs) -- creating or deleting STDP instances after connectCells makes NEURON reassign them
+def checkThreads():
+    cellthreads = cellThreads()
+    moved = sum([int(stdpmech.threadid()) != cellthreads[s.gidDic[pstgid]] for stdpmech,(pregid,pstgid,r) in zip(s.stdpmechs, s.stdpconndata)])
+    if moved: raise Exception('%i STDP adjusters are not on the thread of their postsynaptic cell: STDP instances were created or deleted after the network was built' % moved)
+
+
+## Create an STDP adjuster for receptor r of connection newcon
+def addSTDP(stdpmech, pregid, pstgid, pstid, newcon, r):
+    stdpmech.hebbwt = s.stdprates[s.EorI[pregid],0] # Potentiation rate
+    stdpmech.antiwt = s.stdprates[s.EorI[pregid],1] # Depression rate
+    stdpmech.wmax = s.maxweight # Maximum synaptic weight
+    precon = s.pc.gid_connect(pregid,stdpmech); precon.weight[0] = 1 # Send presynaptic spikes to the STDP adjuster
+    pstcon = s.pc.gid_connect(pstgid,stdpmech); pstcon.weight[0] = -1 # Send postsynaptic spikes to the STDP adjuster
+    precon.delay = pstcon.delay = s.stdpdelay # The same for both, so the STDP timing is unchanged
+    h.setpointer(newcon._ref_weight[r],'synweight',stdpmech) # Associate the STDP adjuster with this weight
+    s.stdpmechs.append(stdpmech) # Save STDP adjuster
+    s.precons.append(precon) # Save presynaptic spike source
+    s.pstcons.append(pstcon) # Save postsynaptic spike source
+    s.stdpconndata.append([pregid,pstgid,r]) # Store presynaptic cell ID, postsynaptic, and receptor
+    if s.verbose: stdpmech.verbose = 1
+    if s.useRL: # using RL
+        stdpmech.RLon = 1 # make sure RL is on
+        stdpmech.RLhebbwt = s.RLrates[s.EorI[pregid],0] # Potentiation rate
+        stdpmech.RLantiwt = s.RLrates[s.EorI[pregid],1] # Depression rate
+        stdpmech.tauhebb = stdpmech.tauanti = s.stdpwin # stdp time constant(ms)
+        stdpmech.RLwindhebb = stdpmech.RLwindhebb = s.eligwin # RL eligibility trace window length (ms)
+        stdpmech.useRLexp = s.useRLexp # RL 
+        stdpmech.softthresh = s.useRLsoft # RL soft-thresholding
+        rlcon = h.NetCon(s.rlsource, stdpmech); rlcon.delay = s.stdpdelay if s.nthreads > 1 else 0; rlcon.weight[1] = 1 # Send reward/punishment events to the STDP adjuster -- with a delay on threads, since they integrate independently for the minimum delay of all NetCons
+        s.rlcons.append(rlcon) # Save reward/punishment source
+    else:
+        stdpmech.RLon = 0 # make sure RL is off
 
 
 ###############################################################################
@@ -602,6 +778,7 @@ def addBackground():
                 backgroundsource.interval = s.backgroundrate**-1*1e3 # Take inverse of the frequency and then convert from Hz^-1 to ms
                 backgroundsource.noiseFromRandom(backgroundrand) # Set it to use this random number generator
                 backgroundsource.noise = s.backgroundnoise # Fractional noise in timing
+            if s.nthreads > 1: backgroundsource.noiseFromRandom(backgroundrand) # Also for NSLOCs, which are only thread safe with their own (see nsloc.mod); serial runs keep the global one, as before
 
             backgroundsource.number = s.backgroundnumber # Number of spikes
             s.backgroundsources.append(backgroundsource) # Save this NetStim
@@ -632,18 +809,22 @@ def addBackground():
 ### Setup Simulation
 ###############################################################################
 def setupSim():
+    s.nruns += 1 # Numbers the checkpoints of each run
+    h.dt = s.dt # Internal integration timestep, e.g. from the command line
+    s.resuming = s.checkpointinterval and checkpoint.exists(checkpoint.filestem()) # Whether runSim will resume this run from a checkpoint
+
     ## reset time variables
     s.timeoflastRL = -inf # Never RL
+    s.timeoflastexchange = -inf # Never exchanged arm/network data
     s.timeoflastsave = -inf # Never saved
     s.timeoflastexplor = -inf # time when last exploratory movement was updated
+    s.timeoflaststream = 0 # time when spikes were last moved to the spike log
+    s.timeoflastcheckpoint = 0 # time when the last checkpoint was saved
 
     # Initialize STDP -- just for recording
     if s.usestdp:
-        s.weightchanges = []
         if s.rank==0: print('\nSetting up STDP...')
-        if s.usestdp:
-            s.weightchanges = [[] for ps in range(s.nstdpconns)] # Create an empty list for each STDP connection -- warning, slow with large numbers of connections!
-        for ps in range(s.nstdpconns): s.weightchanges[ps].append([0, s.stdpmechs[ps].synweight]) # Time of save (0=initial) and the weight
+        setupWeightRecording()
 
 
     ## Set up LFP recording
@@ -691,6 +872,12 @@ def setupSim():
         s.arm.targetid = s.targetid
         s.arm.setup(s)#duration, loopstep, RLinterval, pc, scale, popnumbers, p)
 
+    ## Spike log for moving spikes out of memory during the run
+    if s.spikestreaminterval: spikestream.start(shards.filestem(), keep=s.resuming)
+
+    ## Diagnostic trace of a sample of the cells
+    if s.tracelevel: tracing.start(shards.filestem(), keep=s.resuming)
+
 
     ## Communication setup for plexon input
     if s.PMdinput == 'Plexon':
@@ -754,12 +941,69 @@ def setupSim():
             s.cells[s.gidDic[icell]].play(tvecPMd)  # play back sequence of spikes
 
 
+## Preallocate the array of weight snapshots (time x plastic synapse) and save the initial weights
+def setupWeightRecording():
+    nsnapshots = int(ceil(s.duration/float(s.timebetweensaves)))+2 # Initial weights plus one per save
+    s.weightchanges = zeros((nsnapshots, s.nstdpconns), dtype='float32') # Weight of each plastic synapse at each save
+    s.weighttimes = zeros(nsnapshots) # Time of each save
+    s.nweightsaves = 0 # Number of snapshots taken so far
+    if hasattr(h, 'PtrVector'): # Gather all weights in a single call
+        s.weightptrs = h.PtrVector(s.nstdpconns)
+        for ps in range(s.nstdpconns): s.weightptrs.pset(ps, s.stdpmechs[ps]._ref_synweight)
+        s.weightvec = h.Vector(s.nstdpconns)
+    else: s.weightptrs = None
+    print('  Weight snapshots on host %i: %i plastic synapses, %0.1f kB per snapshot' % (s.rank, s.nstdpconns, s.weightchanges[0].nbytes/1024.))
+    recordWeights(0) # Time of save (0=initial) and the weights
+
+
+## Save the current weight of every plastic synapse as the next row of s.weightchanges
+def recordWeights(t):
+    if s.nweightsaves == len(s.weighttimes): # Out of room (e.g. duration changed after setup), so double the size
+        s.weightchanges = concatenate((s.weightchanges, zeros(s.weightchanges.shape, dtype='float32')))
+        s.weighttimes = concatenate((s.weighttimes, zeros(len(s.weighttimes))))
+    if s.weightptrs is not None and s.nstdpconns:
+        s.weightptrs.gather(s.weightvec)
+        s.weightchanges[s.nweightsaves] = s.weightvec.as_numpy()
+    else:
+        for ps in range(s.nstdpconns): s.weightchanges[s.nweightsaves,ps] = s.stdpmechs[ps].synweight
+    s.weighttimes[s.nweightsaves] = t
+    s.nweightsaves += 1
+
+
+## Point to the voltage of every cell of each LFP population, so the voltages can be gathered in a single call per population
+def setupLFPRecording():
+    if hasattr(h, 'PtrVector'):
+        s.lfpptrs = [h.PtrVector(len(s.lfpcellids[pop])) for pop in range(s.nlfps)]
+        s.lfpvecs = [h.Vector(len(s.lfpcellids[pop])) for pop in range(s.nlfps)]
+        for pop in range(s.nlfps):
+            for c,gid in enumerate(s.lfpcellids[pop]): s.lfpptrs[pop].pset(c, s.cells[s.gidDic[gid]]._ref_V)
+    else: s.lfpptrs = None
+
+
+## Save the sum of the voltages of each LFP population as the LFP estimate
+def recordLFP(t):
+    s.lfptime.append(t) # Append current time
+    tmplfps = zeros((s.nlfps)) # Create empty array for storing LFP voltages
+    for pop in range(s.nlfps):
+        if s.lfpptrs is not None:
+            if len(s.lfpcellids[pop]):
+                s.lfpptrs[pop].gather(s.lfpvecs[pop])
+                tmplfps[pop] = s.lfpvecs[pop].sum() # Add voltages to LFP estimate
+        else:
+            for gid in s.lfpcellids[pop]: tmplfps[pop] += s.cells[s.gidDic[gid]].V # Add voltage to LFP estimate
+        if s.verbose:
+            if s.server.Manager.ns.isnan(tmplfps[pop]) or s.server.Manager.ns.isinf(tmplfps[pop]):
+                print "Nan or inf"
+    s.hostlfps.append(tmplfps) # Add voltages
+
+
 ###############################################################################
 ### Run Simulation
 ###############################################################################
 def runSim():
+    runest = benchmark.estimate('izhistep', s.cellsperhost*s.duration) # None if not calibrated
     if s.rank == 0:
-        print('\nRunning...')
+        print('\nRunning%s...' % ('' if runest is None else ' (est. time: %0.1f s)' % runest))
         runstart = time() # See how long the run takes
 
     # set cache_efficient on
@@ -767,28 +1011,26 @@ def runSim():
     h('cvode = new CVode()')
     h.cvode.cache_efficient(1)
 
-    s.pc.set_maxstep(10) # MPI: Set the maximum integration time in ms -- not very important
+    exchange.configure() # MPI: Interval and options of the spike exchange
     init() # Initialize the simulation
+    if s.nthreads > 1 and s.usestdp: checkThreads()
+    if s.savelfps: setupLFPRecording() # After initializing, since cache_efficient moves the voltages
+    if s.resuming: checkpoint.restore(checkpoint.filestem()) # After initializing, which resets everything that isn't restored
 
+    steptime, waittime = s.pc.step_time(), s.pc.wait_time() # Accumulated over runs, so record the starting values
+    tstart = h.t # Later than 0 when resuming
     while round(h.t) < s.duration:
-        run(min(s.duration,h.t+s.loopstep)) # MPI: Get ready to run the simulation (it isn't actually run until pc.runworker() is called I think)
-        if s.server.simMode == 0:
+        with profiler.timer('integration'): s.pc.psolve(min(s.duration,h.t+s.loopstep)) # MPI: Integrate all hosts until the next loopstep -- same as run(), but also records the compute and wait time of each host
+        if s.tracelevel:
+            with profiler.timer('tracing'): tracing.flush() # Move the trace buffered during this loopstep to the trace file
+        if s.PMdinput != 'Plexon' or s.server.simMode == 0: # Offline mode
             if s.rank==0 and (round(h.t) % s.progupdate)==0: print('  t = %0.1f s (%i%%; time consumed: %0.1f s)' % (h.t/1e3, int(h.t/s.duration*100), (time()-runstart)))
         else:
             if s.rank==0: print('  t = %0.1f s (%i%%; time consumed: %0.1f s)' % (h.t/1e3, int(h.t/s.duration*100), (time()-runstart)))
 
-        # Calculate LFP -- WARNING, need to think about how to optimize
+        # Calculate LFP
         if s.savelfps:
-            s.lfptime.append(h.t) # Append current time
-            tmplfps = zeros((s.nlfps)) # Create empty array for storing LFP voltages
-            for pop in range(s.nlfps):
-                for c in range(len(s.lfpcellids[pop])):
-                    id = s.gidDic[s.lfpcellids[pop][c]]# Index of postynaptic cell -- convert from GID to local
-                    tmplfps[pop] += s.cells[id].V # Add voltage to LFP estimate
-                if s.verbose:
-                    if s.server.Manager.ns.isnan(tmplfps[pop]) or s.server.Manager.ns.isinf(tmplfps[pop]):
-                        print "Nan or inf"
-            s.hostlfps.append(tmplfps) # Add voltages
+            with profiler.timer('lfp'): recordLFP(h.t)
 
         # Periodic weight saves
         if s.usestdp: 
@@ -796,37 +1038,44 @@ def runSim():
             if timesincelastsave >= s.timebetweensaves:
                 s.timeoflastsave = h.t
                 #if s.rank == 0: print 'Recording weight changes at time ', h.t
-                for ps in range(s.nstdpconns):
-                    if s.stdpmechs[ps].synweight != s.weightchanges[ps][-1][-1]: # Only store connections that changed; [ps] = this connection; [-1] = last entry; [-1] = weight
-                        s.weightchanges[ps].append([s.timeoflastsave, s.stdpmechs[ps].synweight])
+                with profiler.timer('weights'): recordWeights(s.timeoflastsave)
                        
         ## Virtual arm 
-        if s.useArm != 'None':
+        if s.useArm != 'None' and h.t - s.timeoflastexchange >= s.armExchangeInterval - h.dt/2: # if time for next arm/network exchange
+            s.timeoflastexchange = h.t
             armStart = time()
-            s.arm.run(h.t, s) # run virtual arm apparatus (calculate command, move arm, feedback)
-            if s.useRL and (h.t - s.timeoflastRL >= s.RLinterval): # if time for next RL
-                s.timeoflastRL = h.t
-                vec = h.Vector()
-                if s.rank == 0:
-                    critic = s.arm.RLcritic(h.t) # get critic signal (-1, 0 or 1)
-                    s.pc.broadcast(vec.from_python([critic]), 0) # convert python list to hoc vector for broadcast data received from arm
-                    #print critic
-                else: # other workers
-                    s.pc.broadcast(vec, 0)
-                    critic = vec.to_python()[0]
-                if critic != 0: # if critic signal indicates punishment (-1) or reward (+1)
+            critic = s.arm.run(h.t, s) # run virtual arm apparatus (exchange command, arm state and critic; move arm; feedback)
+            profiler.add('arm', time()-armStart)
+            RLstart = time()
+            if s.useRL and critic != 0: # if critic signal sent by worker 0 at the last RL update indicates punishment (-1) or reward (+1)
+                if s.RLbroadcast: # a single event updates syn weights of all connections in compiled code
+                    h.reinforcement_STDP = float(critic)
+                    s.rltrigger.event(h.t)
+                else:
                     for stdp in s.stdpmechs: # for all connections in stdp conn list
-                        #print 'stdp_before: ', stdp.synweight
                         stdp.reward_punish(float(critic)) # run stds.mod method to update syn weights based on RL
-                        #print stdp.tlastpre
-                        #print stdp.tlastpost
-                        #stdp.adjustweight(float(0.5))
-                        #sleep(0.001)
-                        #print 'stdp_after: ', stdp.synweight
+            if s.useRL and (h.t - s.timeoflastRL >= s.RLinterval): # if time for next RL
+                s.timeoflastRL = h.t
+                if s.rank == 0: s.arm.RLcritic(h.t) # get critic signal (-1, 0 or 1) -- sent to all workers at the next exchange
+            profiler.add('rl', time()-RLstart)
             # Synaptic scaling?
         
             #print(' Arm time = %0.4f s') % (time() - armStart)
 
+        ## Move spikes from memory to the spike log -- except those the arm may still count for the motor command
+        if s.spikestreaminterval and h.t - s.timeoflaststream >= s.spikestreaminterval*s.loopstep - h.dt/2:
+            s.timeoflaststream = h.t
+            with profiler.timer('spikestream'):
+                if s.useArm != 'None': s.arm.cmdSpikesRemoved(spikestream.drain(h.t - s.cmdtimewin))
+                else: spikestream.drain(h.t)
+
+        ## Save a checkpoint to resume from if the run is stopped -- none at the end, which a rerun would resume instead of running again
+        if s.checkpointinterval and h.t - s.timeoflastcheckpoint >= s.checkpointinterval - h.dt/2 and round(h.t) < s.duration:
+            s.timeoflastcheckpoint = h.t
+            checkpointtime = checkpoint.save(checkpoint.filestem())
+            profiler.add('checkpoint', checkpointtime)
+            if s.rank==0: print('  Checkpoint at t = %0.1f s saved; time = %0.2f s' % (h.t/1e3, checkpointtime))
+
         ## Time adjustment for online mode simulation
         if s.PMdinput == 'Plexon' and s.server.simMode == 1:                   
             # To avoid izhi cell's over shooting when h.t moves forward because sim is slow.
@@ -850,6 +1099,13 @@ def runSim():
         print('  Done; run time = %0.1f s; real-time ratio: %0.2f.' % (s.runtime, s.duration/1000/s.runtime))
     s.pc.barrier() # Wait for all hosts to get to this point
 
+    ## Load imbalance -- integration time of each host, excluding time spent waiting for other hosts
+    steptime, waittime = s.pc.step_time()-steptime, s.pc.wait_time()-waittime
+    maxsteptime, minsteptime, meansteptime = s.pc.allreduce(steptime, 2), s.pc.allreduce(steptime, 3), s.pc.allreduce(steptime, 1)/s.nhosts
+    meanwaittime = s.pc.allreduce(waittime, 1)/s.nhosts
+    if s.rank==0: print('  Compute time per host: min = %0.2f s, mean = %0.2f s, max = %0.2f s; imbalance (max/mean) = %0.2f; mean wait time = %0.2f s' % (minsteptime, meansteptime, maxsteptime, maxsteptime/max(meansteptime,1e-9), meanwaittime))
+    exchange.report(waittime, h.t-tstart)
+
 
 ###############################################################################
 ### Finalize Simulation  (gather data from nodes, etc.)
@@ -858,56 +1114,77 @@ def finalizeSim():
         
     ## Variables to unpack data from all hosts
 
-    ## Pack data from all hosts
+    ## Spikes of this host -- preallocated from the number of spikes of each cell
     if s.rank==0: print('\nGathering spikes...')
     gatherstart = time() # See how long it takes to plot
-    for host in range(s.nhosts): # Loop over hosts
-        if host==s.rank: # Only act on a single host
-            hostspikecells=array([])
-            hostspiketimes=array([])
-            for c in range(len(s.hostspikevecs)): # fails when saving raw
-                thesespikes = array(s.hostspikevecs[c]) # Convert spike times to an array
-                nthesespikes = len(thesespikes) # Find out how many of spikes there were for this cell
-                hostspiketimes = concatenate((hostspiketimes, thesespikes)) # Add spikes from this cell to the list
-                #hostspikecells = concatenate((hostspikecells, (c+host*s.cellsperhost)*ones(nthesespikes))) # Add this cell's ID to the list
-                hostspikecells = concatenate((hostspikecells, s.gidVec[c]*ones(nthesespikes))) # Add this cell's ID to the list
-            if s.saveraw:
-                for c in range(len(s.rawrecordings)):
-                    for q in range(len(s.rawrecordings[c])):
-                        s.rawrecordings[c][q] = array(s.rawrecordings[c][q])
-            messageid=s.pc.pack([hostspiketimes, hostspikecells, s.hostlfps, s.conndata, s.stdpconndata, s.weightchanges, s.rawrecordings]) # Create a mesage ID and store this value
-            s.pc.post(host,messageid) # Post this message
-
+    if s.tracelevel: tracing.stop()
+    if s.spikestreaminterval: # Spikes of this host are in its spike log
+        spikestream.stop()
+        hostspiketimes, hostspikecells = spikestream.read(s.spikestreamfile)
+    else:
+        nspikespercell = [int(vec.size()) for vec in s.hostspikevecs] # fails when saving raw
+        hostspiketimes = zeros(sum(nspikespercell))
+        start = 0
+        for c in range(len(s.hostspikevecs)):
+            hostspiketimes[start:start+nspikespercell[c]] = s.hostspikevecs[c].as_numpy() # Add spikes from this cell to the list
+            start += nspikespercell[c]
+        hostspikecells = repeat(array(s.gidVec, dtype=float), nspikespercell) # Add each cell's ID once per spike
+    s.totalspikes = int(s.pc.allreduce(len(hostspiketimes), 1)) # Total number of spikes
+    s.totalconnections = int(s.pc.allreduce(len(s.conndata[0]), 1)) # Total number of connections
+    s.totalstdpconns = int(s.pc.allreduce(len(s.stdpconndata), 1)) # Total number of STDP connections
+    if s.saveraw:
+        for c in range(len(s.rawrecordings)):
+            for q in range(len(s.rawrecordings[c])):
+                s.rawrecordings[c][q] = array(s.rawrecordings[c][q])
+    if s.usestdp: s.weightchanges = s.weightchanges[:s.nweightsaves] # Drop unused snapshots
+
+    if s.saveshards: # Each host saves its own data instead of sending it to host 0 (see shards.py)
+        shards.save(shards.filestem(), hostspiketimes, hostspikecells)
+        del hostspiketimes, hostspikecells
+        allraw = s.pc.py_gather(s.rawrecordings, 0) # Only raw recordings are gathered
+        if s.rank==0 and s.saveraw: s.allraw = [rec for hostraw in allraw for rec in hostraw] # Append cell-by-cell
+        del allraw
+
+    ## Gather data from all hosts on host 0 -- a single collective instead of a message per host
+    else:
+        alldata = s.pc.py_gather([hostspiketimes, hostspikecells, s.hostlfps, s.conndata, s.stdpconndata, s.weightchanges, s.rawrecordings], 0)
+        del hostspiketimes, hostspikecells
 
     ## Unpack data from all hosts
-    if s.rank==0: # Only act on a single host
-        s.allspikecells = array([])
-        s.allspiketimes = array([])
+    if s.rank==0 and not s.saveshards: # Only act on a single host
+        hostnspikes = [len(hostdata[0]) for hostdata in alldata]
+        s.allspiketimes = zeros(sum(hostnspikes))
+        s.allspikecells = zeros(sum(hostnspikes))
         s.lfps = zeros((len(s.lfptime),s.nlfps)) # Create an empty array for appending LFP data; first entry is for time
-        s.allconnections = [array([]) for i in range(s.nconnpars)] # Store all connections
-        s.allconnections[s.nconnpars-1] = zeros((0,s.nreceptors)) # Create an empty array for appending connections
+        hostconndata = [] # Connections from each host, copied into a single store once all are received
         s.allstdpconndata = zeros((0,3)) # Create an empty array for appending STDP connection data
-        if s.usestdp: s.allweightchanges = [] # empty list so weightchanges in this node don't appear twice
-        s.totalspikes = 0 # Keep a running tally of the number of spikes
-        s.totalconnections = 0 # Total number of connections
-        s.totalstdpconns = 0 # Total number of stdp connections
+        if s.usestdp: hostweightchanges = [] # Weight snapshots from each host, combined once all are received
         if s.saveraw: s.allraw = []        
+        start = 0
         for host in range(s.nhosts): # Loop over hosts
-            s.pc.take(host) # Get the last message
-            hostdata = s.pc.upkpyobj() # Unpack them
-            s.allspiketimes = concatenate((s.allspiketimes, hostdata[0])) # Add spikes from this cell to the list
-            s.allspikecells = concatenate((s.allspikecells, hostdata[1])) # Add this cell's ID to the list
+            hostdata = alldata[host]
+            s.allspiketimes[start:start+hostnspikes[host]] = hostdata[0] # Add spikes from this host to the list
+            s.allspikecells[start:start+hostnspikes[host]] = hostdata[1] # Add each spike's cell ID to the list
+            start += hostnspikes[host]
             if s.savelfps: s.lfps += array(hostdata[2]) # Sum LFP voltages
-            for pp in range(s.nconnpars): s.allconnections[pp] = concatenate((s.allconnections[pp], hostdata[3][pp])) # Append pre/post synapses
+            hostconndata.append(hostdata[3]) # Pre/post synapses
             if s.usestdp and len(hostdata[4]): # Using STDP and at least one STDP connection
                 s.allstdpconndata = concatenate((s.allstdpconndata, hostdata[4])) # Add data on STDP connections
-                for ps in range(len(hostdata[4])): s.allweightchanges.append(hostdata[5][ps]) # "ps" stands for "plastic synapse"
+                hostweightchanges.append(hostdata[5]) # Time x plastic synapse for this host
             if s.saveraw:
                 for c in range(len(hostdata[6])): s.allraw.append(hostdata[6][c]) # Append cell-by-cell
+        del alldata, hostdata
 
-        s.totalspikes = len(s.allspiketimes) # Keep a running tally of the number of spikes
-        s.totalconnections = len(s.allconnections[0]) # Total number of connections
-        s.totalstdpconns = len(s.allstdpconndata) # Total number of STDP connections
+        if s.usestdp: # Combine weight snapshots into one time x plastic synapse array -- all hosts save at the same times
+            s.allweightchanges = hstack(hostweightchanges) if len(hostweightchanges) else zeros((s.nweightsaves,0), dtype='float32')
+            s.weighttimes = s.weighttimes[:s.nweightsaves]
+            del hostweightchanges
+        if s.nhosts==1: s.allconnections = s.conndata # Nothing to combine, so use this host's store directly
+        else:
+            store = connectivity.ConnStore(sum([len(conndata[0]) for conndata in hostconndata]), s.filename+'_allconn' if s.connmemmap else None)
+            for conndata in hostconndata: store.append(*conndata) # Append pre/post synapses
+            s.allconnections = store.columns()
+        del hostconndata
         
 
     # Record background spike data (cliff: only for one node since takes too long to pack for all and just needed for debugging)
@@ -932,12 +1209,10 @@ def finalizeSim():
     else: s.stimspikedata = [] # For saving so no error
 
     gathertime = time()-gatherstart # See how long it took
+    profiler.add('gather', gathertime)
     if s.rank==0: print('  Done; gather time = %0.1f s.' % gathertime)
     s.pc.barrier()
 
-    #mindelay = s.pc.allreduce(s.pc.set_maxstep(10), 2) # flag 2 returns minimum value
-    #if s.rank==0: print 'Minimum delay (time-step for queue exchange) is ',mindelay
-
 
     ## Finalize virtual arm (es. close pipes, saved data)
     if s.useArm != 'None':
@@ -958,8 +1233,11 @@ def finalizeSim():
         print('  Run time: %0.1f s (%i-s sim; %i scale; %i cells; %i workers)' % (s.runtime, s.duration/1e3, s.scale, s.ncells, s.nhosts))
         print('  Spikes: %i (%0.2f Hz)' % (s.totalspikes, s.firingrate))
         print('  Connections: %i (%i STDP; %0.2f per cell)' % (s.totalconnections, s.totalstdpconns, s.connspercell))
-        print('  Mean connection distance: %0.2f um' % mean(s.allconnections[2]))
-        print('  Mean connection delay: %0.2f ms' % mean(s.allconnections[3]))
+        if not s.saveshards:
+            print('  Mean connection distance: %0.2f um' % mean(s.allconnections[2]))
+            print('  Mean connection delay: %0.2f ms' % mean(s.allconnections[3]))
+        if s.useArm != 'None' and len(s.arm.exchangeTimeAll): print('  Arm/network exchanges: %i (every %0.1f ms); mean collective time: %0.3f ms per exchange' % (len(s.arm.exchangeTimeAll), s.armExchangeInterval, 1e3*mean(s.arm.exchangeTimeAll)))
+    if s.profile: profiler.report() # Collective -- on all hosts
 
 
 ###############################################################################
@@ -971,12 +1249,13 @@ def saveData():
         if s.savetxt: 
             filename = '../data/m1ms-spk.txt'
             fd = open(filename, "w")
-            for c in range(len(s.allspiketimes)):
-                print >> fd, int(s.allspikecells[c]), s.allspiketimes[c], s.popNamesDic[s.cellnames[int(s.allspikecells[c])]]
+            allspiketimes, allspikecells = analysis.getspikes()
+            for c in range(len(allspiketimes)):
+                print >> fd, int(allspikecells[c]), allspiketimes[c], s.popNamesDic[s.cellnames[int(allspikecells[c])]]
             fd.close()
             print "[Spikes are stored in", filename, "]"
 
-            if s.verbose:
+            if s.verbose and not s.saveshards:
                 filename = 'm1ms-conn.txt'
                 fd = open(filename, "w")
                 for c in range(len(s.allconnections[0])):
@@ -998,12 +1277,13 @@ def saveData():
                 fobj.close() # Close file object
             
             # Tidy variables
-            spikedata = vstack([s.allspikecells,s.allspiketimes]).T # Put spike data together
-            connections = vstack([s.allconnections[0],s.allconnections[1]]).T # Put connection data together
-            distances = s.allconnections[2] # Pull out distances
-            delays = s.allconnections[3] # Pull out delays
-            weights = s.allconnections[4] # Pull out weights
-            stdpdata = s.allstdpconndata # STDP connection data
+            if not s.saveshards:
+                spikedata = vstack([s.allspikecells,s.allspiketimes]).T # Put spike data together
+                connections = vstack([s.allconnections[0],s.allconnections[1]]).T # Put connection data together
+                distances = s.allconnections[2] # Pull out distances
+                delays = s.allconnections[3] # Pull out delays
+                weights = s.allconnections[4] # Pull out weights
+                stdpdata = s.allstdpconndata # STDP connection data
             if s.usestims: stimdata = [vstack(s.stimstruct[c][1]).T for c in range(len(stimstruct))] # Only pull out vectors, not text, in stimdata
 
             # Save variables
@@ -1016,8 +1296,7 @@ def saveData():
             targetidAll = s.arm.targetidAll 
             errorAll = s.arm.errorAll 
             criticAll = s.arm.criticAll
-            if not hasattr(s, 'phase'): s.phase = ''
-            s.filename = s.outfilestem+'_target_'+str(s.arm.targetid)+s.phase
+            s.filename = shards.filestem()
             if s.armMinimalSave: # save only data related to arm reaching (for evol alg)
                 variablestosave = ['targetPos', 'angAll', 'motorCmdAll', 'errorAll']
             else:
@@ -1026,12 +1305,15 @@ def saveData():
             if s.savelfps:  
                 variablestosave.extend(['s.lfptime', 's.lfps'])   
             if s.usestdp: 
-                variablestosave.extend(['stdpdata', 's.allweightchanges'])
+                variablestosave.extend(['stdpdata', 's.allweightchanges', 's.weighttimes'])
             if s.savebackground:
                 variablestosave.extend(['s.backgrounddata'])
             if s.saveraw: 
                 variablestosave.extend(['s.stimspikedata', 's.allraw'])
             if s.usestims: variablestosave.extend(['stimdata'])
+            if s.saveshards: # Already saved by each host
+                variablestosave = [var for var in variablestosave if var not in ['spikedata', 'connections', 'distances', 'delays', 'weights', 's.lfps', 'stdpdata', 's.allweightchanges']]
+                print('Spikes, connections, weights and LFPs of each host are saved in %s' % shards.shardFile(s.filename, 0).replace('_shard0', '_shard*'))
             savecommand = "savemat(s.filename, {"
             for var in range(len(variablestosave)): savecommand += "'" + variablestosave[var].replace('s.','') + "':" + variablestosave[var] + ", " # Create command out of all the variables
             savecommand = savecommand[:-2] + "}, oned_as='column')" # Omit final comma-space and complete command
@@ -1041,6 +1323,8 @@ def saveData():
 
             savetime = time()-savestart # See how long it took to save
             print('  Done; time = %0.1f s' % savetime)
+            profiler.add('save', savetime)
+    if s.profile: profiler.report() # Again, now including the save time
 
 
 ###############################################################################
@@ -41,6 +41,8 @@ PROCEDURE seed(x) {
 INITIAL {
 	on = 0 : off
 	ispike = 0
+	transition = 0
+	last_interval = 0 : as in a new NSLOC -- otherwise the first interval check compares with the last run, or with whatever NSLOC used this memory before
 	if (noise < 0) {
 		noise = 0
 	}
@@ -0,0 +1,62 @@
+"""
+PROFILER
+
+Wall time of each phase of the simulation on every host: connection
+calculation, gid_connect, STDP creation, integration, arm, RL, LFP, weight
+recording, spike streaming, tracing, checkpoints, gather and save. Times are accumulated from the
+start of the process. With s.profile, finalizeSim and saveData call report(),
+which reduces them to min/mean/max across hosts and writes them to
+s.profilefile as JSON, so runs can be compared.
+
+Usage example:
+    import profiler
+    with profiler.timer('gather'):
+        gatherData()
+    profiler.add('integration', seconds) # or add a time measured elsewhere
+    profiler.report() # On all hosts
+
+Version: 2026oct18
+"""
+
+from time import time
+from datetime import datetime
+import json
+import shared as s
+
+phases = ['conncalc', 'gid_connect', 'stdp', 'integration', 'arm', 'rl', 'lfp', 'weights', 'spikestream', 'tracing', 'checkpoint', 'gather', 'save'] # Reported in this order; other phases after them
+times = {} # Accumulated wall time of each phase on this host (s)
+counts = {} # Number of times each phase was timed on this host
+
+
+def add(phase, seconds):
+    times[phase] = times.get(phase, 0) + seconds
+    counts[phase] = counts.get(phase, 0) + 1
+
+
+## Time a block of code: with profiler.timer(phase): ...
+class timer(object):
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time()
+
+    def __exit__(self, *args):
+        add(self.phase, time()-self.start)
+
+
+## Reduce the times of all hosts to min/mean/max for each phase; print them and save them to s.profilefile on host 0
+def report():
+    allphases = phases + sorted(set(sum(s.pc.py_allgather(times.keys()), [])) - set(phases)) # Same on every host
+    summary = {}
+    for phase in allphases:
+        t = times.get(phase, 0)
+        summary[phase] = {'min':s.pc.allreduce(t, 3), 'mean':s.pc.allreduce(t, 1)/s.nhosts, 'max':s.pc.allreduce(t, 2), 'count':int(s.pc.allreduce(counts.get(phase, 0), 2))}
+    if s.rank == 0:
+        print('\nProfile (wall time per host, s):')
+        print('  %-12s %10s %10s %10s %8s' % ('phase', 'min', 'mean', 'max', 'count'))
+        for phase in allphases: print('  %-12s %10.3f %10.3f %10.3f %8i' % (phase, summary[phase]['min'], summary[phase]['mean'], summary[phase]['max'], summary[phase]['count']))
+        info = {'timestamp':datetime.today().strftime("%d %b %Y %H:%M:%S"), 'nhosts':s.nhosts, 'scale':s.scale, 'ncells':s.ncells, 'duration':s.duration}
+        with open(s.profilefile, 'w') as f: json.dump({'info':info, 'phases':summary, 'order':allphases}, f, indent=1)
+        print('  Saved to %s' % s.profilefile)
+    return summary
@@ -0,0 +1,30 @@
+COMMENT
+
+Reward/punishment broadcast source for STDP mechanisms
+
+Relays each event it receives to every STDP mechanism it is connected to, so
+that a reward or punishment reaches all plastic synapses on a host with a
+single event instead of one reward_punish() call per synapse. The value of the
+critic is set in the STDP global reinforcement_STDP before sending the event.
+
+Example Python usage:
+
+rlsource = h.RLSource()
+rltrigger = h.NetCon(None, rlsource) # Used to send events from Python
+rlcon = h.NetCon(rlsource, stdpmech) # One for each STDP mechanism
+rlcon.delay = 0 # > 0 if running on threads (pc.nthread), e.g. 1
+rlcon.weight[1] = 1 # Marks this as a reward/punishment event
+h.reinforcement_STDP = 1 # Reward (1) or punishment (-1)
+rltrigger.event(h.t) # Deliver it to every STDP mechanism after the delay -- at the current time if 0
+
+Version: 2026oct18
+
+ENDCOMMENT
+
+NEURON {
+    ARTIFICIAL_CELL RLSource
+}
+
+NET_RECEIVE (w) {
+    net_event(t)
+}
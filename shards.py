@@ -0,0 +1,102 @@
+"""
+SHARDS
+
+Per-host output files, as an alternative to gathering everything on host 0 and
+saving a single .mat file (which is limited by the memory of host 0 and the
+size limit of .mat v5 files). With s.saveshards, finalizeSim makes each host
+save its own spikes, connections, STDP connections, weight snapshots and LFP
+contributions to <filestem>_shard<host>.npz, and nothing is gathered.
+
+ShardedData presents the shards of a run as one dataset. Arrays are read from
+the files only when they are requested, one shard at a time, so a query (e.g.
+the spikes of some cells in a time window) only needs memory for its result.
+merge() combines all shards into a single .npz file, with the same variable
+names as the .mat file saved by saveData.
+
+Usage examples:
+    import shards
+    data = shards.ShardedData('m1ms_target_0')
+    spiketimes, spikecells = data.spikes(tmin=0, tmax=1000, gids=range(100))
+    weights = data['weights']
+
+    nrniv -python shards.py m1ms_target_0 # Merge shards into m1ms_target_0.npz
+
+Version: 2026oct18
+"""
+
+from pylab import array, zeros, concatenate, hstack, inf
+from numpy import load as npload, savez, in1d
+from glob import glob
+import sys
+import shared as s
+
+connnames = ['pre', 'post', 'distances', 'delays', 'weights'] # Connection columns, as in s.conndata
+
+
+## Filestem of the output files of this run -- the same as the .mat file saved by saveData
+def filestem():
+    if not hasattr(s, 'phase'): s.phase = ''
+    return s.outfilestem+'_target_'+str(s.arm.targetid)+s.phase
+
+
+def shardFile(stem, host):
+    return '%s_shard%i.npz' % (stem, host)
+
+
+## Save the data of this host
+def save(stem, spiketimes, spikecells):
+    savez(shardFile(stem, s.rank), host=s.rank, nhosts=s.nhosts, spiketimes=spiketimes, spikecells=spikecells,
+          stdpconndata=array(s.stdpconndata).reshape(-1,3), weightchanges=s.weightchanges, weighttimes=s.weighttimes[:s.nweightsaves] if s.usestdp else zeros(0),
+          lfptime=array(s.lfptime), lfps=array(s.hostlfps).reshape(len(s.lfptime),s.nlfps), **dict(zip(connnames, s.conndata)))
+
+
+## Data saved by all hosts of a run, presented as one dataset
+class ShardedData:
+    ## How the arrays of each shard are combined
+    merges = {'spiketimes':concatenate, 'spikecells':concatenate, 'pre':concatenate, 'post':concatenate, 'distances':concatenate,
+              'delays':concatenate, 'weights':concatenate, 'stdpconndata':concatenate, 'weightchanges':lambda arrs: hstack(arrs),
+              'lfps':sum, 'weighttimes':lambda arrs: arrs[0], 'lfptime':lambda arrs: arrs[0]}
+
+    def __init__(self, stem):
+        self.stem = stem
+        self.files = [npload(shardFile(stem, host)) for host in range(len(glob(stem+'_shard*.npz')))] # Arrays are only read when accessed
+        if not len(self.files): raise IOError('No shards found for %s' % stem)
+        if len(self.files) != int(self.files[0]['nhosts']): raise IOError('Found %i of %i shards for %s' % (len(self.files), int(self.files[0]['nhosts']), stem))
+
+    ## Array combined over all shards, e.g. data['spiketimes']
+    def __getitem__(self, name):
+        return self.merges[name]([shard[name] for shard in self.files])
+
+    ## Spike times and cell IDs, optionally only in a time window and/or for some cells
+    def spikes(self, tmin=-inf, tmax=inf, gids=None):
+        spiketimes, spikecells = [], []
+        for shard in self.files:
+            times, cells = shard['spiketimes'], shard['spikecells']
+            keep = (times >= tmin) & (times <= tmax)
+            if gids is not None: keep &= in1d(cells, gids)
+            spiketimes.append(times[keep])
+            spikecells.append(cells[keep])
+        return concatenate(spiketimes), concatenate(spikecells)
+
+    ## Connection columns (pre, post, distances, delays, weights), as in s.allconnections
+    def connections(self):
+        return [self[name] for name in connnames]
+
+    def close(self):
+        for shard in self.files: shard.close()
+
+
+## Combine all shards into a single file
+def merge(stem, filename=None):
+    data = ShardedData(stem)
+    spiketimes, spikecells = data.spikes()
+    pre, post, distances, delays, weights = data.connections()
+    savez(filename or stem+'.npz', spikedata=array([spikecells, spiketimes]).T, connections=array([pre, post]).T, distances=distances, delays=delays,
+          weights=weights, stdpdata=data['stdpconndata'], allweightchanges=data['weightchanges'], weighttimes=data['weighttimes'],
+          lfptime=data['lfptime'], lfps=data['lfps'])
+    data.close()
+
+
+if __name__ == '__main__':
+    args = sys.argv[sys.argv.index(__file__)+1:] if __file__ in sys.argv else sys.argv[1:] # nrniv passes its own arguments first
+    merge(*args[:2])
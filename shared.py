@@ -11,17 +11,30 @@ Version: 2015feb12 by salvadord
 ### IMPORT MODULES
 ###############################################################################
 
-from pylab import array, inf, zeros, seed
+from numpy import array, inf, zeros, repeat, arange # Not pylab, which takes longer to import
+from numpy.random import seed
 from neuron import h # Import NEURON
 from izhi import RS, IB, CH, LTS, FS, TC, RTN # Import Izhikevich model
 from nsloc import nsloc # NetStim with location unit type
-import server # Server for plexon interface
 from time import time
 from math import radians
 import hashlib
 def id32(obj): return int(hashlib.md5(obj).hexdigest()[0:8],16)# hash(obj) & 0xffffffff # for random seeds (bitwise AND to retain only lower 32 bits)
 
 
+## Module that is only imported when one of its attributes is first used
+class LazyModule(object):
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None: self._module = __import__(self._name)
+        return getattr(self._module, attr)
+
+server = LazyModule('server') # Server for plexon interface -- importing it starts a multiprocessing manager process, so only done if used (PMdinput = 'Plexon')
+
+
 ## MPI
 pc = h.ParallelContext() # MPI: Initialize the ParallelContext class
 nhosts = int(pc.nhost()) # Find number of hosts
@@ -54,10 +67,6 @@ PMdinput = 'spikes' # 'Plexon', 'spikes', 'SSM', 'targetSplit'
 
     
 # Define params for each cell: cellpops, cellnames, cellclasses, EorI 
-cellpops = [] # Store list of populations for each cell -- e.g. 1=ER2 vs. 2=IF2
-cellnames = [] # Store list of names for each cell -- e.g. 'ER2' vs. 'IF2'
-cellclasses = [] # Store list of classes types for each cell -- e.g. pyramidal vs. interneuron
-EorI = [] # Store list of excitatory/inhibitory for each cell
 popnumbers = scale*array(popratios) # Number of neurons in each population
 if PMdinput == 'Plexon' and 'PMd' in popnames:    
     popratios[popnames.index('PMd')] = server.numPMd
@@ -67,22 +76,17 @@ for c in range(len(popnames)):
     start = sum(popnumbers[:c])
     popGidStart.append(start)
     popGidEnd.append(start + popnumbers[c] - 1)
-for pop in range(npops): # Loop over each population
-    for c in range(int(popnumbers[pop])): # Loop over each cell in that population
-        cellpops.append(pop) # Append this cell's population type to the list
-        cellnames.append(popnames[pop]) # Append this cell's population type to the list
-        cellclasses.append(popclasses[pop]) # Just use integers to index them
-        EorI.append(popEorI[pop]) # Append this cell's excitatory/inhibitory state to the list
-cellpops = array(cellpops) 
-cellnames = array(cellnames)
-EorI = array(EorI)
+cellpops = repeat(arange(npops), popnumbers.astype(int)) # Population of each cell -- e.g. 1=ER2 vs. 2=IF2
+cellnames = array(popnames)[cellpops] # Name of each cell -- e.g. 'ER2' vs. 'IF2'
+cellclasses = array(popclasses)[cellpops] # Class of each cell -- e.g. pyramidal vs. interneuron
+EorI = array(popEorI)[cellpops] # Whether each cell is excitatory or inhibitory
 
 
 # Assign numbers to each of the different variables so they can be used in the other functions
 # initializes the following variables:
 # ASC, EDSC, ER2, IF2, IL2, ER5, EB5, IF5, IL5, ER6, IF6, IL6, AMPA, NMDA, GABAA, GABAB, opsin, Epops, Ipops, allpops 
-for i,name in enumerate(popnames): exec(name+'=i') # Set population names to the integers
-for i,name in enumerate(receptornames): exec(name+'=i') # Set population names to the integers
+globals().update(zip(popnames, range(npops))) # Set population names to the integers
+globals().update(zip(receptornames, range(nreceptors))) # Set receptor names to the integers
 allpops = array(range(npops)) # Create an array with all the population numbers
 Epops = allpops[array(popEorI)==0] # Pick out numbers corresponding to excitatory populations
 Ipops = allpops[array(popEorI)==1] # Pick out numbers corresponding to inhibitory populations
@@ -210,25 +214,47 @@ connweights[PMd,ER5,AMPA]=PMdconnweight
 ## Simulation parameters
 trainTime = 1*1e3 # duration of traininig phase, in ms
 testTime = 1*1e3 # duration of testing/evaluation phase, in ms
+paralleltest = False # Whether to test the targets all at once, each in a forked copy of the trained network (see testTargets in network.py) -- serial runs on one thread only; with MPI or threads they are tested one after another
 duration = 1*1e3 # Duration of the simulation, in ms
-h.dt = 0.5 # Internal integration timestep to use
+dt = 0.5 # Internal integration timestep to use, in ms -- set as h.dt by setupSim, so it can be changed on the command line
+h.dt = dt
+integration = 'euler' # Integration method of the Izhikevich cells: 'euler' (forward Euler, which needs dt = 0.5) or 'exponential' (exact conductance decays and membrane update for each step, see expstep() in izhi2007.inc; allows dt = 1, e.g. integration='exponential' dt=1 on the command line)
+artificialcells = True # Whether the Izhikevich cells are Izhi2007a artificial cells, which need no section (see izhi2007a.mod), or Izhi2007 point processes, each in a section of its own
+nthreads = 1 # Threads per host (pc.nthread), each integrating its share of the host's cells (see setupThreads in network.py) -- e.g. nthreads = 4 on a 4-core workstation, without MPI, or 2 hosts x 2 threads. Threaded runs differ from serial ones, which keep the global random stream for the NSLOC inputs and deliver rewards/punishments without delay; and with STDP they vary slightly between runs: spikes that reach an STDP mechanism at the same time from other threads arrive in the order the threads send them
 loopstep = 10 # Step size in ms for simulation loop -- not coincidentally the step size for the LFP
+maxstep = 10 # Maximum interval between the spike exchanges of the hosts, in ms -- the minimum delay of the NetCons between hosts if shorter (see exchange.py)
+spikecompress = 0 # Spikes per host sent compressed (one byte for the time, and for the gid with less than 256 cells per host) in each spike exchange (see exchange.py); 0 = no compression
+multisend = False # Whether each host sends its spikes only to the hosts with targets of them, instead of to all hosts -- needs a NEURON built with multisend
+binqueue = False # Whether to keep events in bins of one time step instead of a priority queue (cvode.queue_mode) -- only with artificialcells = False (see exchange.py)
+armExchangeInterval = 10 # Interval in ms between arm/network exchanges (motor command, arm state and critic in one collective) -- a positive multiple of loopstep (checked by Arm.setup)
 progupdate = 5000 # How frequently to update progress, in ms
 randseed = 1 # Random seed to use
 limitmemory = False # Whether or not to limit RAM usage
+calibrationfile = 'calibration.json' # Results of the calibration suite (nrniv -python benchmark.py calibrate), used for time estimates
+calibrationscales = [1, 2, 4, 8] # Scales measured by the calibration suite
 
 
 
 ## Saving and plotting parameters
 outfilestem = '' # filestem to save fitness result
 savemat = True # Whether or not to write spikes etc. to a .mat file
+saveshards = False # Whether each host saves its own spikes, connections, weights and LFPs to <filestem>_shard<host>.npz instead of gathering them on host 0 (see shards.py)
+spikestreaminterval = 0 # Every how many loopsteps to move recorded spikes from memory to <filestem>_spikes<host>.bin (see spikestream.py); 0 = keep them in memory until the end
+profile = False # Whether or not to report the wall time of each phase (connectivity, gid_connect, STDP, integration, arm, RL, LFP, gather, save) as min/mean/max across hosts (see profiler.py)
+profilefile = 'profile.json' # File to save the profile report to
+checkpointinterval = 0 # Interval in ms between checkpoints of each run, which runSim resumes from if the run is restarted (see checkpoint.py); 0 = no checkpoints
+checkpointfile = 'checkpoint' # Name of the checkpoints, after outfilestem (see checkpoint.filestem)
+nruns = 0 # Number of runs (setupSim calls) so far in this process -- numbers the checkpoints of each run
 armMinimalSave = False # save only arm data and spikes (for target reaching evol opt)
 savetxt = False # save spikes and conn to txt file
 savelfps = False # Whether or not to save LFPs
 lfppops = [[ER2], [ER5], [EB5], [ER6]] # Populations for calculating the LFP from
 savebackground = False # save background (NetStims) inputs
 saveraw = False # Whether or not to record raw voltages etc.
-verbose = 0 # Whether to write nothing (0), diagnostic information on events (1), or everything (2) a file directly from izhi.mod
+verbose = 0 # Whether to print diagnostic information (e.g. the RL events of every STDP mechanism) -- for the Izhikevich cells, see tracelevel
+tracelevel = 0 # Whether to trace nothing (0), the events (1), or the events and time steps (2) of a sample of the Izhikevich cells to <filestem>_trace<host>.bin (see tracing.py)
+tracefraction = 0.01 # Fraction of the Izhikevich cells traced with tracelevel
+tracebuffer = 1000 # Records buffered per traced cell between the flushes at each loopstep -- if more come, the oldest are dropped
 filename = 'm1ms'  # Set file output name
 plotraster = False # Whether or not to plot a raster
 plotpeth = False # plot perievent time histogram 
@@ -250,6 +276,16 @@ receptorweight = [1, 1, 1, 1, 1] # Scale factors for each receptor
 scaleconnprob = 200/scale*array([[1, 1], [1, 1]]) # scale*1* Connection probabilities for EE, EI, IE, II synapses, respectively -- scale for scale since size fixed
 connfalloff = 100*array([2, 3]) # Connection length constants in um for E and I synapses, respectively
 toroidal = True # Whether or not to have toroidal topology
+connbuilder = 'grid' # How to find presynaptic cells: 'grid' (only test cells within a cutoff distance, see connectivity.py) or 'full' (test all cells)
+conntolerance = 1e-5 # Connection probability below which cell pairs are not tested by the grid builder (sets the cutoff distance)
+connbuildercheck = False # Whether to also run the full builder and report the speedup and differing connections
+conncache = False # Whether to save the connectivity of each host to disk and reuse it when the network parameters are the same (see conncache.py)
+conncachedir = 'conncache' # Directory for the connectivity cache
+conncachesize = 2e9 # Maximum size of the connectivity cache in bytes; least recently used files are deleted first
+snapshotfile = '' # Filestem of a snapshot of the trained network (see snapshot.py): if it exists, runTrainTest2targets(Optim) restores the network from it instead of creating and training it; otherwise the network is saved there after training
+connmemmap = False # Whether to store connections in memory-mapped files (filename_conn<rank>_*.dat) instead of RAM, e.g. for scale=40
+loadbalance = False # Whether to assign cells to hosts by estimated cost (see network.distributeCells) instead of round-robin
+loadbalancecosts = [0.1, 1, 0.01, 0.02] # Estimated relative cost of an NSLOC/VecStim cell, an Izhikevich cell, each incoming connection and each STDP mechanism
 if useconnprobdata == False: connprobs = array(connprobs>0,dtype='int') # Optionally cnvert from float data into binary yes/no
 if useconnweightdata == False: connweights = array(connweights>0,dtype='int') # Optionally convert from float data into binary yes/no
 
@@ -269,15 +305,18 @@ stdprates = stdpFactor * array([[1, -1.3], [0, 0]])#0.1*array([[0.025, -0.025],
 RLfactor = 0.1
 RLrates = RLfactor*array([[0.25, -0.25], [0.0, 0.0]]) # RL potentiation/depression rates for E->anything and I->anything, e.g. [0,:] is pot/dep for E cells
 RLinterval = 50 # interval between sending reward/critic signal (set equal to motorCmdWin/2)(ms)
+RLbroadcast = True # Deliver the reward/critic signal to all STDP mechanisms with a single event (see rlsource.mod) instead of calling each one from Python
 timeoflastRL = -inf # Never RL
+timeoflastexchange = -inf # Never exchanged arm/network data
 stdpwin = 10 # length of stdp window (ms) (scholarpedia=10; Frem13=20(+),40(-))
+stdpdelay = 1 # Delay of the NetCons that send the pre- and postsynaptic spikes, and, on threads, the rewards/punishments, to the STDP mechanisms, in ms -- also limits the spike exchange interval with MPI (see exchange.py), e.g. stdpdelay = mindelay
 eligwin = 50 # length of RL eligibility window (ms) (Frem13=500ms)
 useRLexp = 0 # Use binary or exp decaying eligibility trace
 useRLsoft = 1 # Use soft thresholding 
 maxweight = 8 # Maximum synaptic weight
 timebetweensaves = 5*1e3 # How many ms between saving weights(can't be smaller than loopstep)
 timeoflastsave = -inf # Never saved
-weightchanges = [] # to periodically store weigth changes
+weightchanges = [] # to periodically store weights of plastic synapses (time x synapse array, see network.setupWeightRecording)
 
 
 ## Background input parameters
@@ -367,13 +406,4 @@ stimpars = [stimmod(touch,name='LTP',sta=ltptimes[0],fin=ltptimes[1]), stimmod(t
 
 
 
-## Peform a mini-benchmarking test for future time estimates
-if rank==0:
-    print('Benchmarking...')
-    benchstart = time()
-    for i in range(int(1.36e6)): tmp=0 # Number selected to take 0.1 s on my machine
-    performance = 1/(10*(time() - benchstart))*100
-    print('  Running at %0.0f%% default speed (%0.0f%% total)' % (performance, performance*nhosts))
-
-
 
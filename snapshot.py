@@ -0,0 +1,89 @@
+"""
+SNAPSHOT
+
+Snapshots of a built (and usually trained) network, so it can be tested many
+times -- e.g. against different targets, PMd lesion levels or background rates
+-- without creating and training it again. Each host saves its own part of the
+network to <stem>_snapshot<host>.npz: its cells and their Izhikevich
+parameters, and its connections (as s.conndata) with the current weight of
+every NetCon.
+
+restore() creates the network from a snapshot instead of calculating the
+connections, and then sets the saved weights and cell parameters -- only the
+connectivity, weights and parameters are restored. The state of the STDP
+mechanisms and of the virtual arm is not saved: as between the phases of a
+single run, init() resets the STDP state at the start of the next run and
+setupSim sets up the arm again, so a restored network is tested just as it
+would be right after training (to continue a run with all its state, see
+checkpoint.py). The network must be restored with the same number of hosts and
+the same STDP/RL settings it had when it was created, so that the same STDP
+mechanisms exist.
+
+Usage example:
+    import snapshot
+    createNetwork(); ...; runSim(); finalizeSim() # Train
+    snapshot.save('m1ms_trained')
+
+    snapshot.restore('m1ms_trained') # In another run, instead of createNetwork and training
+    addStimulation(); addBackground(); setupSim(); runSim() # Test
+
+Version: 2026oct18
+"""
+
+from pylab import array
+from numpy import load as npload, savez_compressed
+from time import time
+from neuron import h
+import os
+import shared as s
+from shards import connnames
+
+izhiparams = ['C', 'k', 'vr', 'vt', 'vpeak', 'a', 'b', 'c', 'd', 'celltype'] # Parameters of each Izhi2007 cell
+
+
+def snapshotFile(stem, host):
+    return '%s_snapshot%i.npz' % (stem, host)
+
+
+## Whether a snapshot of this network exists for every host
+def exists(stem):
+    return bool(s.pc.allreduce(int(os.path.exists(snapshotFile(stem, s.rank))), 3))
+
+
+## Save the network of this host
+def save(stem):
+    savestart = time()
+    izhigids = [gid for gid,cell in zip(s.gidVec, s.cells) if hasattr(cell, 'vpeak')] # Not NSLOCs and VecStims
+    data = {'nhosts':s.nhosts, 'ncells':s.ncells, 'scale':s.scale, 't':h.t, 'gidVec':array(s.gidVec),
+            'izhigids':array(izhigids, dtype=int), 'izhiparams':array([[getattr(s.cells[s.gidDic[gid]], par) for par in izhiparams] for gid in izhigids]).reshape(-1,len(izhiparams)),
+            'netconweights':array([[con.weight[r] for r in range(s.nreceptors)] for con in s.connlist]).reshape(-1,s.nreceptors),
+            'stdpconndata':array(s.stdpconndata, dtype=int).reshape(-1,3)}
+    data.update(zip(connnames, s.conndata))
+    filename = snapshotFile(stem, s.rank)
+    tmpfilename = filename[:-4] + '_tmp.npz'
+    savez_compressed(tmpfilename, **data)
+    os.rename(tmpfilename, filename) # Atomic, so an interrupted save never leaves a partial snapshot
+    s.pc.barrier()
+    if s.rank==0: print('Saved network snapshot to %s; time = %0.1f s' % (snapshotFile(stem, 0).replace('snapshot0', 'snapshot*'), time()-savestart))
+
+
+## Create the network saved by save(), instead of createNetwork()
+def restore(stem):
+    import network
+    restorestart = time()
+    data = npload(snapshotFile(stem, s.rank))
+    if int(data['nhosts']) != s.nhosts or int(data['ncells']) != s.ncells:
+        raise Exception('Snapshot %s was saved with %i hosts and %i cells, not %i hosts and %i cells' % (stem, int(data['nhosts']), int(data['ncells']), s.nhosts, s.ncells))
+    network.createNetwork(conndata=[data[name] for name in connnames])
+    if list(data['gidVec']) != list(s.gidVec): raise Exception('Cells of host %i differ from snapshot %s (e.g. load balancing settings changed)' % (s.rank, stem))
+    if len(data['stdpconndata']) != s.nstdpconns: raise Exception('Snapshot %s has %i STDP mechanisms on host %i, not %i -- create the network with the same usestdp, useRL and plastConnsType' % (stem, len(data['stdpconndata']), s.rank, s.nstdpconns))
+
+    for con,weights in zip(s.connlist, data['netconweights'].tolist()): # Includes the weights adjusted by STDP, since those point to NetCon weights
+        for r in range(s.nreceptors): con.weight[r] = weights[r]
+    for gid,pars in zip(data['izhigids'].tolist(), data['izhiparams'].tolist()):
+        cell = s.cells[s.gidDic[gid]]
+        for par,value in zip(izhiparams, pars): setattr(cell, par, value)
+    tsaved = float(data['t'])
+    data.close()
+    s.pc.barrier()
+    if s.rank==0: print('Restored network snapshot %s (saved at t = %0.1f s); time = %0.1f s' % (stem, tsaved/1e3, time()-restorestart))
@@ -0,0 +1,66 @@
+"""
+SPIKESTREAM
+
+Streaming spike writer for long runs. Instead of keeping every spike in the
+recording Vectors of this host (s.hostspikevecs) until finalizeSim, runSim
+calls drain() every s.spikestreaminterval loopsteps: spikes recorded since the
+last drain are appended to <filestem>_spikes<host>.bin and removed from the
+Vectors, so memory stays flat and partial results can be read during the run.
+
+Each spike is a record of (gid int32, time float32). Spikes the virtual arm may
+still count for the motor command (the last s.cmdtimewin ms) are kept in the
+Vectors until the next drain.
+
+Usage example (e.g. from another process while the simulation is running):
+    import spikestream
+    spiketimes, spikecells = spikestream.read('m1ms_target_0_spikes0.bin')
+
+Version: 2026oct18
+"""
+
+from pylab import array, concatenate, repeat, zeros, inf
+from numpy import dtype, fromfile, searchsorted, empty
+from os.path import exists
+import shared as s
+
+spikedtype = dtype([('gid', '<i4'), ('t', '<f4')]) # One record per spike
+
+
+## Create the spike log of this host -- or keep the existing one, to resume a run from a checkpoint (see checkpoint.py)
+def start(stem, keep=False):
+    s.spikestreamfile = '%s_spikes%i.bin' % (stem, s.rank)
+    s.spikestream = open(s.spikestreamfile, 'r+b' if keep and exists(s.spikestreamfile) else 'wb')
+    s.nstreamedspikes = 0 # Spikes written to the log so far
+
+
+## Move spikes recorded before tmax from the Vectors to the log; returns the number of spikes removed from each cell's Vector
+def drain(tmax=inf):
+    nspikes = zeros(len(s.hostspikevecs), dtype=int)
+    times = []
+    for c,vec in enumerate(s.hostspikevecs):
+        spikes = vec.as_numpy() # no copy
+        nspikes[c] = searchsorted(spikes, tmax, 'right')
+        if nspikes[c]: times.append(array(spikes[:nspikes[c]]))
+    if len(times):
+        records = empty(nspikes.sum(), dtype=spikedtype)
+        records['gid'] = repeat(s.gidVec, nspikes)
+        records['t'] = concatenate(times)
+        records.tofile(s.spikestream)
+        s.spikestream.flush() # Readable during the run
+        s.nstreamedspikes += len(records)
+        for c in nspikes.nonzero()[0]: s.hostspikevecs[c].remove(0, nspikes[c]-1)
+    return nspikes
+
+
+## Write the remaining spikes and close the log
+def stop():
+    nspikes = drain()
+    s.spikestream.close()
+    return nspikes
+
+
+## Spike times and cell IDs in a spike log (only complete records, so it can be read during the run)
+def read(filename):
+    records = fromfile(filename, dtype='uint8')
+    records = records[:len(records)//spikedtype.itemsize*spikedtype.itemsize].view(spikedtype)
+    return records['t'].astype(float), records['gid'].astype(float)
@@ -25,7 +25,7 @@ for c in range(ncells): cells.append(h.IntFire4(0,sec=dummy)) # Create the cells
 threshold = 10 # Set voltage threshold
 delay = 1 # Set connection delay
 singlesyn = h.NetCon(cells[0],cells[1], threshold, delay, 0.5) # Create a connection between the cells
-stdpmech = h.STDP(0,sec=dummy) # Create the STDP mechanism
+stdpmech = h.STDP() # Create the STDP mechanism
 presyn = h.NetCon(cells[0],stdpmech, threshold, delay, 1) # Feed presynaptic spikes to the STDP mechanism -- must have weight >0
 pstsyn = h.NetCon(cells[1],stdpmech, threshold, delay, -1) # Feed postsynaptic spikes to the STDP mechanism -- must have weight <0
 h.setpointer(singlesyn._ref_weight[0],'synweight',stdpmech) # Point the STDP mechanism to the connection weight
@@ -35,7 +35,8 @@ Version: 2013oct24 by cliffk
 ENDCOMMENT
 
 NEURON {
-    POINT_PROCESS STDP : Definition of mechanism
+    ARTIFICIAL_CELL STDP : Definition of mechanism -- no BREAKPOINT, so it needs no section
+    THREADSAFE : reinforcement is only set from Python, between runs of the threads
     POINTER synweight : Pointer to the weight (in a NetCon object) to be adjusted.
     RANGE tauhebb, tauanti : LTP/LTD decay time constants (in ms) for the Hebbian (pre-before-post-synaptic spikes), and anti-Hebbian (post-before-pre-synaptic) cases. 
     RANGE hebbwt, antiwt : Maximal adjustment (can be positive or negative) for Hebbian and anti-Hebbian cases (i.e., as inter-spike interval approaches zero).  This should be set positive for LTP and negative for LTD.
@@ -54,6 +55,7 @@ NEURON {
     RANGE deltaw : The calculated weight change.
     RANGE newweight : New calculated weight.
     RANGE skip : Flag to skip 2nd set of conditions
+    GLOBAL reinforcement : Reward (positive) or punishment (negative) delivered by events from an RLSource (see rlsource.mod)
 }
 
 ASSIGNED {
@@ -95,11 +97,19 @@ PARAMETER {
     RLon = 1
     verbose = 0
     skip = 0
+    reinforcement = 0
 }
 
-NET_RECEIVE (w) {
+NET_RECEIVE (w, isreward) {
+    INITIAL { } : Keep isreward at finitialize -- otherwise NEURON sets it to 0
     deltaw = 0.0 : Default the weight change to 0.
     skip = 0
+
+    : Reward/punishment broadcast from an RLSource -- NetCons from an RLSource have weight[1] = 1
+    if (isreward == 1) {
+        skip = 1 : skip the 2nd set of conditions since this is not a spike
+        reward_punish(reinforcement)
+    }
     
     if (verbose > 1)  { printf("t=%f (BEFORE) tlaspre=%f, tlastpost=%f, flag=%f, w=%f, deltaw=%f \n",t,tlastpre, tlastpost,flag,w,deltaw) }
 
@@ -187,6 +197,12 @@ FUNCTION softthreshold(rawwc) {
     else { softthreshold = rawwc * synweight / wmax } : Otherwise (the weight change is negative), scale by weight / wmax.    
 }
 
+FUNCTION threadid() { : Thread this adjuster was assigned to (pc.nthread), or -1 before the threads are set up (e.g. by fcurrent or finitialize)
+    VERBATIM
+    _lthreadid = _nt ? (double)_nt->_id : -1;
+    ENDVERBATIM
+}
+
 PROCEDURE adjustweight(wc) {
    synweight = synweight + wc : apply the synaptic modification, and then clip the weight if necessary to make sure it's between 0 and wmax.
    if (synweight > wmax) { synweight = wmax }
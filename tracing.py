@@ -0,0 +1,86 @@
+"""
+TRACING
+
+Diagnostic trace of the Izhikevich cells, with s.tracelevel: 1 traces the
+events of each traced cell (inputs and spikes), 2 also every time step. A
+sample of the cells is traced (a fraction s.tracefraction, drawn with the same
+seed on every host, so it doesn't depend on the number of hosts). Each traced
+cell keeps its records in a ring buffer in memory (see trace() in
+izhi2007.inc) instead of writing a line to a file per time step, and runSim
+calls flush() at every loopstep to move the records of all traced cells of
+this host to <filestem>_trace<host>.bin in a single write.
+
+Each record has the fields of tracedtype. kind is -1 for a time step,
+otherwise the flag of the event: 0 = input, 2 = spike (and 1 = the
+initialization of an Izhi2007 point process). Records are in time order for
+each cell, and grouped by cell within each loopstep. If more than
+s.tracebuffer records of a cell come between two flushes, the oldest are
+dropped; stop() reports how many.
+
+Usage example:
+    import tracing
+    trace = tracing.read('m1ms_target_0_trace0.bin')
+    steps = trace[(trace['gid']==12) & (trace['kind']==-1)]
+    plot(steps['t'], steps['V'])
+
+Version: 2026oct18
+"""
+
+from numpy import dtype, fromfile, empty, concatenate
+from numpy.random import RandomState
+from os.path import exists
+from neuron import h
+import shared as s
+
+bufferfields = ['t', 'cellid', 'kind', 'delta', 'gAMPA', 'gNMDA', 'gGABAA', 'gGABAB', 'gOpsin', 'factor', 'I', 'V', 'u'] # Values of a record in the buffer of a cell, in order (TRACEFIELDS in izhi2007.inc)
+tracedtype = dtype([('t', '<f8'), ('gid', '<i4'), ('kind', '<i4')] + [(field, '<f4') for field in bufferfields[3:]]) # One record per event or time step
+
+
+## Gids of the traced cells -- the same sample for any number of hosts
+def tracedGids():
+    sample = RandomState(s.randseed).rand(s.ncells) < s.tracefraction
+    return set(sample.nonzero()[0])
+
+
+## Start tracing the sampled cells of this host into its trace file -- or keep the existing one, to resume a run from a checkpoint (see checkpoint.py)
+def start(stem, keep=False):
+    gids = tracedGids()
+    s.tracedcells = [cell for gid,cell in zip(s.gidVec, s.cells) if gid in gids and s.cellnames[gid] not in ['PMd', 'ASC']]
+    for cell in s.tracedcells: cell.trace(s.tracelevel, s.tracebuffer)
+    s.tracevec = h.Vector() # Records of one cell at each flush
+    s.tracefile = '%s_trace%i.bin' % (stem, s.rank)
+    s.tracestream = open(s.tracefile, 'r+b' if keep and exists(s.tracefile) else 'wb')
+    s.ntracerecords = 0 # Records written to the trace file so far
+    s.ndroppedrecords = 0 # Records dropped since the buffers were full
+
+
+## Move the buffered records of the traced cells of this host to its trace file
+def flush():
+    buffered = []
+    for cell in s.tracedcells:
+        s.ndroppedrecords += int(cell.traceflush(s.tracevec))
+        if s.tracevec.size(): buffered.append(s.tracevec.as_numpy().reshape(-1, len(bufferfields)).copy())
+    if len(buffered):
+        buffered = concatenate(buffered)
+        records = empty(len(buffered), dtype=tracedtype)
+        records['gid'] = buffered[:,1]
+        for f,field in enumerate(bufferfields):
+            if field != 'cellid': records[field] = buffered[:,f]
+        records.tofile(s.tracestream)
+        s.tracestream.flush() # Readable during the run
+        s.ntracerecords += len(records)
+
+
+## Write the remaining records, stop tracing and close the trace file
+def stop():
+    flush()
+    for cell in s.tracedcells: cell.trace(0) # Frees the buffers
+    s.tracestream.close()
+    ntraced, ndropped = int(s.pc.allreduce(len(s.tracedcells), 1)), int(s.pc.allreduce(s.ndroppedrecords, 1))
+    if s.rank==0: print('  Traced %i cells to %s%s' % (ntraced, s.tracefile.replace('_trace0', '_trace*'), '; %i records dropped -- increase tracebuffer' % ndropped if ndropped else ''))
+
+
+## Records in a trace file (only complete records, so it can be read during the run)
+def read(filename):
+    records = fromfile(filename, dtype='uint8')
+    return records[:len(records)//tracedtype.itemsize*tracedtype.itemsize].view(tracedtype)
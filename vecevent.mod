@@ -2,6 +2,7 @@
 
 NEURON {
 	ARTIFICIAL_CELL VecStim
+	THREADSAFE
 	POINTER ptr
 }
 